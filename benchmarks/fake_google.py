@@ -0,0 +1,196 @@
+import hashlib
+import json
+import re
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from benchmarks.fake_server import FakeApp, json_response
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+
+
+def error_response(status: int, message: str, reason: str = "notFound"):
+    return json_response({"error": {"code": status, "message": message,
+                                    "errors": [{"reason": reason, "message": message}]}}, status=status)
+
+
+def page(items: list, query: dict, default_size: int) -> tuple[list, str | None]:
+    """
+    the page of the items selected by the pageToken and pageSize or maxResults parameters
+    """
+    start = int(query.get("pageToken", ["0"])[0] or 0)
+    size = int((query.get("pageSize") or query.get("maxResults") or [default_size])[0])
+    next_token = str(start + size) if start + size < len(items) else None
+    return items[start:start + size], next_token
+
+
+class FakeGoogle(FakeApp):
+    """
+    stand-in for the google drive v3 and google tasks v1 apis used by the sync: files list, create, get and
+    resumable uploads, tasklists and tasks list and insert, and the batch endpoints of both
+    """
+
+    routes = [
+        ("GET", "/drive/v3/files", "list_files"),
+        ("POST", "/drive/v3/files", "create_file"),
+        ("GET", "/drive/v3/files/([^/]+)", "get_file"),
+        ("POST", "(?:/resumable)?/upload/drive/v3/files", "start_upload"),
+        ("PATCH", "(?:/resumable)?/upload/drive/v3/files/([^/]+)", "start_upload"),
+        ("PUT", "(?:/resumable)?/upload/drive/v3/files", "upload_chunk"),
+        ("GET", "/tasks/v1/users/@me/lists", "list_tasklists"),
+        ("POST", "/tasks/v1/users/@me/lists", "insert_tasklist"),
+        ("GET", "/tasks/v1/lists/([^/]+)/tasks", "list_tasks"),
+        ("POST", "/tasks/v1/lists/([^/]+)/tasks", "insert_task"),
+        ("POST", "/batch(?:/.*)?", "batch"),
+    ]
+
+    def __init__(self, latency: float = 0):
+        super().__init__(latency)
+        self.files: dict[str, dict] = {}
+        self.tasklists: dict[str, dict] = {}
+        self.tasks: dict[str, list[dict]] = {}
+        self.uploads: dict[str, dict] = {}
+        self._compiled_routes = [(method, re.compile(pattern), name) for method, pattern, name in self.routes]
+
+    def handle(self, method, path, query, headers, body):
+        path = unquote(path)
+        for route_method, pattern, name in self._compiled_routes:
+            match = pattern.fullmatch(path)
+            if match and route_method == method:
+                self.count(name)
+                return getattr(self, name)(match, query, headers, body)
+        self.count("not_found")
+        return error_response(404, f"{method} {path} not found")
+
+    # drive
+
+    def list_files(self, match, query, headers, body):
+        q = query.get("q", [""])[0]
+        name = re.search(r"name='([^']*)'", q)
+        mime_type = re.search(r"mimeType='([^']*)'", q)
+        parent = re.search(r"'([^']*)' in parents", q)
+        files = [file for file in self.files.values()
+                 if not file["trashed"]
+                 and (name is None or file["name"] == name.group(1))
+                 and (mime_type is None or file["mimeType"] == mime_type.group(1))
+                 and (parent is None or parent.group(1) in file["parents"])]
+        files, next_token = page(files, query, 100)
+        result = {"files": files}
+        if next_token:
+            result["nextPageToken"] = next_token
+        return json_response(result)
+
+    def _new_file(self, metadata: dict, content: bytes = None) -> dict:
+        file = {"id": uuid.uuid4().hex, "name": metadata.get("name", "untitled"),
+                "mimeType": metadata.get("mimeType", "application/pdf"), "parents": metadata.get("parents", []),
+                "trashed": False}
+        self._set_content(file, content)
+        self.files[file["id"]] = file
+        return file
+
+    @staticmethod
+    def _set_content(file: dict, content: bytes | None):
+        if content is not None:
+            file["size"] = str(len(content))
+            file["md5Checksum"] = hashlib.md5(content).hexdigest()
+
+    def create_file(self, match, query, headers, body):
+        return json_response(self._new_file(json.loads(body or b"{}")))
+
+    def get_file(self, match, query, headers, body):
+        file = self.files.get(match.group(1))
+        if file is None:
+            return error_response(404, f"File not found: {match.group(1)}")
+        return json_response(file)
+
+    def start_upload(self, match, query, headers, body):
+        file_id = match.group(1) if match.groups() else None
+        if file_id is not None and file_id not in self.files:
+            return error_response(404, f"File not found: {file_id}")
+        upload_id = uuid.uuid4().hex
+        self.uploads[upload_id] = {"metadata": json.loads(body or b"{}"), "file_id": file_id,
+                                   "content": bytearray()}
+        location = f"http://{headers['Host']}/upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}"
+        return 200, {"Location": location}, b""
+
+    def upload_chunk(self, match, query, headers, body):
+        upload = self.uploads.get(query.get("upload_id", [""])[0])
+        if upload is None:
+            return error_response(404, "Upload session not found")
+        upload["content"] += body
+        content_range = re.fullmatch(r"bytes (?:\d+-\d+|\*)/(\d+|\*)", headers.get("Content-Range", ""))
+        total = content_range.group(1) if content_range else str(len(upload["content"]))
+        if total == "*" or int(total) > len(upload["content"]):
+            return 308, {"Range": f"bytes=0-{len(upload['content']) - 1}"}, b""
+
+        self.uploads.pop(query["upload_id"][0])
+        content = bytes(upload["content"])
+        if upload["file_id"] is not None:
+            file = self.files[upload["file_id"]]
+            self._set_content(file, content)
+        else:
+            file = self._new_file(upload["metadata"], content)
+        return json_response(file)
+
+    # tasks
+
+    def list_tasklists(self, match, query, headers, body):
+        items, next_token = page(list(self.tasklists.values()), query, 20)
+        result = {"items": items}
+        if next_token:
+            result["nextPageToken"] = next_token
+        return json_response(result)
+
+    def insert_tasklist(self, match, query, headers, body):
+        tasklist = {"id": uuid.uuid4().hex, **json.loads(body or b"{}")}
+        self.tasklists[tasklist["id"]] = tasklist
+        self.tasks[tasklist["id"]] = []
+        return json_response(tasklist)
+
+    def list_tasks(self, match, query, headers, body):
+        if match.group(1) not in self.tasks:
+            return error_response(404, f"Task list not found: {match.group(1)}")
+        items, next_token = page(self.tasks[match.group(1)], query, 20)
+        result = {"items": items}
+        if next_token:
+            result["nextPageToken"] = next_token
+        return json_response(result)
+
+    def insert_task(self, match, query, headers, body):
+        if match.group(1) not in self.tasks:
+            return error_response(404, f"Task list not found: {match.group(1)}")
+        task = {"id": uuid.uuid4().hex, "status": "needsAction", **json.loads(body or b"{}")}
+        self.tasks[match.group(1)].append(task)
+        return json_response(task)
+
+    # batch
+
+    def batch(self, match, query, headers, body):
+        """
+        run every part of a multipart/mixed batch request as an http request and return their responses
+        """
+        content_type = headers["Content-Type"]
+        message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        for part in message.iter_parts():
+            request = part.get_payload(decode=False)
+            request = request if isinstance(request, str) else request.as_string()
+            head, _, part_body = request.replace("\r\n", "\n").partition("\n\n")
+            request_line, *header_lines = head.split("\n")
+            method, uri, _ = request_line.split(" ", 2)
+            part_headers = dict(line.split(": ", 1) for line in header_lines if ": " in line)
+            url = urlsplit(uri)
+
+            status, response_headers, payload = self.handle(method, url.path, parse_qs(url.query), part_headers,
+                                                            part_body.encode())
+            content_id = part["Content-ID"].strip("<>")
+            response_headers = "".join(f"{name}: {value}\r\n" for name, value in response_headers.items())
+            parts.append(f"--{boundary}\r\nContent-Type: application/http\r\n"
+                         f"Content-ID: <response-{content_id}>\r\n\r\n"
+                         f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n{response_headers}\r\n"
+                         f"{payload.decode()}\r\n")
+        payload = "".join(parts) + f"--{boundary}--\r\n"
+        return 200, {"Content-Type": f"multipart/mixed; boundary={boundary}"}, payload.encode()
@@ -0,0 +1,263 @@
+import re
+from datetime import date, timedelta
+from urllib.parse import parse_qs, quote
+
+from benchmarks.fake_server import FakeApp, get_cookies, html_response, json_response, redirect
+
+SESSION_COOKIE = "session=ok; Path=/"
+
+
+def make_invoices(prefix: str, count: int, interval_days: int, end_date: date) -> list[dict]:
+    """
+    the invoices of a fake account, newest first like the provider portals list them
+    """
+    invoices = []
+    for i in range(count):
+        doc_date = end_date - timedelta(days=i * interval_days)
+        invoices.append({
+            "id": f"{prefix}{count - i:06d}",
+            "doc_date": doc_date,
+            "due_date": doc_date + timedelta(days=30),
+            "amount": round(20 + (i * 7.31) % 180, 2),
+        })
+    return invoices
+
+
+def make_pdf(invoice_id: str, size: int) -> bytes:
+    header = f"%PDF-1.4\n% fake invoice {invoice_id}\n".encode()
+    return header + b"0" * max(size - len(header), 0)
+
+
+def login_form(action: str, username_type: str = "text") -> str:
+    return (f'<html><body><form action="{action}" method="post">'
+            f'<input type="hidden" name="csrf" value="fake-csrf-token">'
+            f'<input type="{username_type}" name="username" placeholder="username">'
+            f'<input type="password" name="password" placeholder="password">'
+            f'</form></body></html>')
+
+
+class FakeProviderApp(FakeApp):
+    """
+    stand-in for the portal of a provider: a login form that sets a session cookie, the invoice listing and the
+    pdf downloads. the routes are (method, path regex, handler name), the handlers receive the match of the path
+    """
+    prefix = "INV"
+    routes: list[tuple[str, str, str]] = []
+
+    def __init__(self, invoices: int, pdf_size: int, latency: float = 0, interval_days: int = 2,
+                 end_date: date = None):
+        super().__init__(latency)
+        self.invoices = make_invoices(self.prefix, invoices, interval_days, end_date or date.today())
+        self.pdf_size = pdf_size
+        self._compiled_routes = [(method, re.compile(pattern), name) for method, pattern, name in self.routes]
+
+    def handle(self, method, path, query, headers, body):
+        for route_method, pattern, name in self._compiled_routes:
+            match = pattern.fullmatch(path)
+            if match and route_method == method:
+                self.count(name)
+                return getattr(self, name)(match, query, headers, body)
+        self.count("not_found")
+        return html_response("not found", status=404)
+
+    @staticmethod
+    def logged_in(headers) -> bool:
+        return get_cookies(headers).get("session") == "ok"
+
+    @staticmethod
+    def check_login(body: bytes) -> bool:
+        form = parse_qs(body.decode())
+        return bool(form.get("username")) and bool(form.get("password")) and bool(form.get("csrf"))
+
+    def find_invoice(self, invoice_id: str) -> dict | None:
+        return next((invoice for invoice in self.invoices if invoice["id"] == invoice_id), None)
+
+    def pdf(self, invoice_id: str):
+        if self.find_invoice(invoice_id) is None:
+            return html_response("not found", status=404)
+        return 200, {"Content-Type": "application/pdf"}, make_pdf(invoice_id, self.pdf_size)
+
+
+class FakeFastweb(FakeProviderApp):
+    prefix = "FW"
+    routes = [
+        ("GET", "/myfastweb/accesso/login/", "login_page"),
+        ("POST", "/myfastweb/accesso/login/", "login"),
+        ("GET", "/myfastweb/", "home"),
+        ("GET", "/myfastweb/accesso/seleziona-codice-cliente/", "profiles"),
+        ("POST", "/myfastweb/accesso/seleziona-codice-cliente/", "select_profile"),
+        ("GET", "/myfastweb/abbonamento/le-mie-fatture/", "invoices_page"),
+        ("POST", "/myfastweb/abbonamento/le-mie-fatture/ajax/index.php", "invoice_list"),
+        ("GET", r"/myfastweb/abbonamento/le-mie-fatture/conto-fastweb/Conto-FASTWEB-(.+)-\d{8}\.pdf", "download"),
+    ]
+
+    def __init__(self, invoices: int, pdf_size: int, client_codes: list[str], **kwargs):
+        super().__init__(invoices, pdf_size, **kwargs)
+        self.client_codes = client_codes
+
+    def login_page(self, match, query, headers, body):
+        return html_response(login_form("/myfastweb/accesso/login/"))
+
+    def login(self, match, query, headers, body):
+        if not self.check_login(body):
+            return redirect("/myfastweb/accesso/login/")
+        return redirect("/myfastweb/", {"Set-Cookie": SESSION_COOKIE})
+
+    def home(self, match, query, headers, body):
+        if not self.logged_in(headers):
+            return redirect("/myfastweb/accesso/login/")
+        return html_response("<html><body>MyFastweb</body></html>")
+
+    def profiles(self, match, query, headers, body):
+        if not self.logged_in(headers):
+            return redirect("/myfastweb/accesso/login/")
+        inputs = "".join(f'<input type="radio" name="clientCode" value="{code}">' for code in self.client_codes)
+        return html_response(f'<html><body><form action="/myfastweb/accesso/seleziona-codice-cliente/" '
+                             f'method="post"><input type="hidden" name="step" value="1">{inputs}</form></body></html>')
+
+    def select_profile(self, match, query, headers, body):
+        client_code = parse_qs(body.decode()).get("clientCode", [None])[0]
+        if not self.logged_in(headers) or client_code not in self.client_codes:
+            return html_response("invalid client code", status=400)
+        return redirect("/myfastweb/", {"Set-Cookie": f"client={client_code}; Path=/"})
+
+    def invoices_page(self, match, query, headers, body):
+        if not self.logged_in(headers):
+            return redirect("/myfastweb/accesso/login/")
+        return html_response('<html><body><input type="hidden" name="securityToken" value="fake-token">'
+                             '</body></html>')
+
+    def invoice_list(self, match, query, headers, body):
+        if not self.logged_in(headers) or "client" not in get_cookies(headers):
+            return json_response({"error": "not logged in"}, status=401)
+        return json_response({"invoiceList": [{
+            "NumDoc": invoice["id"],
+            "DocDateYMD": invoice["doc_date"].isoformat(),
+            "DocExpireDateYMD": invoice["due_date"].isoformat(),
+            "DocAmount": invoice["amount"],
+        } for invoice in self.invoices]})
+
+    def download(self, match, query, headers, body):
+        if not self.logged_in(headers):
+            return html_response("forbidden", status=403)
+        return self.pdf(match.group(1))
+
+
+class FakeFastwebEnergia(FakeProviderApp):
+    prefix = "FE"
+    routes = [
+        ("GET", "/myfastweb-energia/login/", "login_page"),
+        ("POST", "/myfastweb-energia/login/", "login"),
+        ("GET", "/myfastweb-energia/", "home"),
+        ("POST", "/myfastweb-energia/services/invoices/", "invoice_list"),
+        ("GET", r"/myfastweb-energia/bollette/download/(.+)-\d{4}-\d{2}-\d{2}\.pdf", "download"),
+    ]
+
+    def login_page(self, match, query, headers, body):
+        return html_response(login_form("/myfastweb-energia/login/"))
+
+    def login(self, match, query, headers, body):
+        if not self.check_login(body):
+            return redirect("/myfastweb-energia/login/")
+        return redirect("/myfastweb-energia/", {"Set-Cookie": SESSION_COOKIE})
+
+    def home(self, match, query, headers, body):
+        if not self.logged_in(headers):
+            return redirect("/myfastweb-energia/login/")
+        return html_response("<html><body>MyFastweb Energia</body></html>")
+
+    def invoice_list(self, match, query, headers, body):
+        if not self.logged_in(headers):
+            return json_response({"error": "not logged in"}, status=401)
+        return json_response({"invoiceList": [{
+            "NumDoc": invoice["id"],
+            "DocDateYMD": invoice["doc_date"].isoformat(),
+            "DocExpireDateYMD": invoice["due_date"].isoformat(),
+            "DocAmount": invoice["amount"],
+        } for invoice in self.invoices]})
+
+    def download(self, match, query, headers, body):
+        if not self.logged_in(headers):
+            return html_response("forbidden", status=403)
+        return self.pdf(match.group(1))
+
+
+class FakeEni(FakeProviderApp):
+    """
+    the eni login needs the browser to solve a recaptcha, the fake portal accepts every request as if the cached
+    session was still valid
+    """
+    prefix = "ENI"
+    routes = [
+        ("GET", "/serviceDAp/api/c360/init", "init"),
+        ("GET", "/serviceDAp/c360/api/conti/([^/]+)/bollette", "invoice_list"),
+        ("GET", "/serviceDAp/c360/api/conti/([^/]+)/download-doc-pdf", "download"),
+    ]
+
+    def init(self, match, query, headers, body):
+        return json_response({"codiceContoDefault": "ACC1", "codiceCliente": "CLI1"})
+
+    def invoice_list(self, match, query, headers, body):
+        return json_response({"bollette": [{
+            "numeroBolletta": invoice["id"],
+            "emissione": invoice["doc_date"].strftime("%d/%m/%Y"),
+            "scadenza": invoice["due_date"].strftime("%d/%m/%Y"),
+            "importo": invoice["amount"],
+        } for invoice in self.invoices]})
+
+    def download(self, match, query, headers, body):
+        return self.pdf(query.get("numeroFattura", [""])[0])
+
+
+class FakeUmbraAcque(FakeProviderApp):
+    prefix = "UA"
+    routes = [
+        ("GET", "/umbraacque/login/", "login_page"),
+        ("POST", "/umbraacque/login/", "login"),
+        ("GET", "/umbraacque/", "home"),
+        ("GET", "/bin/acea-myacea/utenze/", "contracts"),
+        ("GET", "/bin/acea-myacea/invoicesAndBalance/", "invoice_list"),
+        ("GET", "/bin/acea-myacea/download/", "download"),
+    ]
+
+    def login_page(self, match, query, headers, body):
+        return html_response(login_form("/umbraacque/login/", username_type="email"))
+
+    def login(self, match, query, headers, body):
+        if not self.check_login(body):
+            return redirect("/umbraacque/login/")
+        return redirect("/umbraacque/", {"Set-Cookie": SESSION_COOKIE})
+
+    def home(self, match, query, headers, body):
+        return html_response("<html><body>MyAcea</body></html>")
+
+    def contracts(self, match, query, headers, body):
+        if not self.logged_in(headers):
+            return json_response({"error": "not logged in"}, status=401)
+        return json_response({"data": [{"contractPk": "PK1"}]})
+
+    def invoice_list(self, match, query, headers, body):
+        if not self.logged_in(headers):
+            return json_response({"error": "not logged in"}, status=401)
+        return json_response({"body": {"invoices": [{
+            "invoiceNumber": invoice["id"],
+            "issueDate": invoice["doc_date"].strftime("%d/%m/%Y"),
+            "expiryDate": invoice["due_date"].strftime("%d/%m/%Y"),
+            "total": invoice["amount"],
+            "documentLink": quote(f"{invoice['id']}&path=/content/acea-myacea"),
+            "contractId": "CT1",
+        } for invoice in self.invoices]}})
+
+    def download(self, match, query, headers, body):
+        if not self.logged_in(headers):
+            return html_response("forbidden", status=403)
+        return self.pdf(query.get("code", [""])[0])
+
+
+# the fake portal of every provider and the origins it stands in for
+FAKE_PROVIDERS = {
+    "fastweb": (FakeFastweb, ["https://fastweb.it"]),
+    "fastweb_energia": (FakeFastwebEnergia, ["https://www.fastweb.it"]),
+    "eni": (FakeEni, ["https://eniplenitude.com"]),
+    "umbra_acque": (FakeUmbraAcque, ["https://self-service.umbraacque.com"]),
+}
@@ -0,0 +1,127 @@
+import hashlib
+import uuid
+from urllib.parse import unquote
+from xml.etree import ElementTree
+
+from benchmarks.fake_server import FakeApp
+
+S3_NAMESPACE = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+
+def xml_response(root: ElementTree.Element, status: int = 200) -> tuple[int, dict, bytes]:
+    root.set("xmlns", S3_NAMESPACE)
+    return status, {"Content-Type": "application/xml"}, ElementTree.tostring(root, xml_declaration=True,
+                                                                            encoding="utf-8")
+
+
+def xml_element(tag: str, children: dict = None) -> ElementTree.Element:
+    element = ElementTree.Element(tag)
+    for name, value in (children or {}).items():
+        ElementTree.SubElement(element, name).text = str(value)
+    return element
+
+
+def error_response(status: int, code: str, message: str) -> tuple[int, dict, bytes]:
+    return xml_response(xml_element("Error", {"Code": code, "Message": message}), status=status)
+
+
+class FakeS3(FakeApp):
+    """
+    stand-in for an s3 compatible object store with path style buckets: objects put, head and list,
+    and multipart uploads. every bucket exists
+    """
+
+    def __init__(self, latency: float = 0):
+        super().__init__(latency)
+        self.objects: dict[tuple[str, str], dict] = {}
+        self.uploads: dict[str, dict] = {}
+
+    def handle(self, method, path, query, headers, body):
+        bucket, _, key = unquote(path).lstrip("/").partition("/")
+        if method == "GET" and not key:
+            self.count("list_objects")
+            return self.list_objects(bucket, query)
+        if method == "HEAD" and key:
+            self.count("head_object")
+            return self.head_object(bucket, key)
+        if method == "PUT" and key and "uploadId" in query:
+            self.count("upload_part")
+            return self.upload_part(query, body)
+        if method == "PUT" and key:
+            self.count("put_object")
+            return self.put_object(bucket, key, headers, body)
+        if method == "POST" and key and "uploads" in query:
+            self.count("create_multipart_upload")
+            return self.create_multipart_upload(bucket, key, headers)
+        if method == "POST" and key and "uploadId" in query:
+            self.count("complete_multipart_upload")
+            return self.complete_multipart_upload(query)
+        if method == "DELETE" and key and "uploadId" in query:
+            self.count("abort_multipart_upload")
+            self.uploads.pop(query["uploadId"][0], None)
+            return 204, {}, b""
+        self.count("not_found")
+        return error_response(404, "NoSuchKey", f"{method} {path} not found")
+
+    @staticmethod
+    def _get_metadata(headers) -> dict[str, str]:
+        return {name.lower(): value for name, value in headers.items() if name.lower().startswith("x-amz-meta-")}
+
+    def _store(self, bucket: str, key: str, content: bytes, etag: str, metadata: dict[str, str]):
+        self.objects[(bucket, key)] = {"content": content, "etag": f'"{etag}"', "metadata": metadata}
+
+    def list_objects(self, bucket, query):
+        prefix = query.get("prefix", [""])[0]
+        max_keys = int(query.get("max-keys", ["1000"])[0])
+        start_after = query.get("continuation-token", [""])[0]
+        keys = sorted(key for object_bucket, key in self.objects
+                      if object_bucket == bucket and key.startswith(prefix) and key > start_after)
+        page = keys[:max_keys]
+
+        root = xml_element("ListBucketResult", {"Name": bucket, "Prefix": prefix, "KeyCount": len(page),
+                                                "MaxKeys": max_keys, "IsTruncated": str(len(keys) > max_keys).lower()})
+        if len(keys) > max_keys:
+            ElementTree.SubElement(root, "NextContinuationToken").text = page[-1]
+        for key in page:
+            item = self.objects[(bucket, key)]
+            root.append(xml_element("Contents", {"Key": key, "ETag": item["etag"], "Size": len(item["content"]),
+                                                 "LastModified": "2025-01-01T00:00:00.000Z",
+                                                 "StorageClass": "STANDARD"}))
+        return xml_response(root)
+
+    def head_object(self, bucket, key):
+        item = self.objects.get((bucket, key))
+        if item is None:
+            return 404, {}, b""
+        return 200, {"ETag": item["etag"], "Content-Length": str(len(item["content"])),
+                     "Content-Type": "application/pdf", **item["metadata"]}, b""
+
+    def put_object(self, bucket, key, headers, body):
+        etag = hashlib.md5(body).hexdigest()
+        self._store(bucket, key, body, etag, self._get_metadata(headers))
+        return 200, {"ETag": f'"{etag}"'}, b""
+
+    def create_multipart_upload(self, bucket, key, headers):
+        upload_id = uuid.uuid4().hex
+        self.uploads[upload_id] = {"bucket": bucket, "key": key, "metadata": self._get_metadata(headers),
+                                   "parts": {}}
+        return xml_response(xml_element("InitiateMultipartUploadResult",
+                                        {"Bucket": bucket, "Key": key, "UploadId": upload_id}))
+
+    def upload_part(self, query, body):
+        upload = self.uploads.get(query["uploadId"][0])
+        if upload is None:
+            return error_response(404, "NoSuchUpload", "upload not found")
+        upload["parts"][int(query["partNumber"][0])] = body
+        return 200, {"ETag": f'"{hashlib.md5(body).hexdigest()}"'}, b""
+
+    def complete_multipart_upload(self, query):
+        upload = self.uploads.pop(query["uploadId"][0], None)
+        if upload is None:
+            return error_response(404, "NoSuchUpload", "upload not found")
+        parts = [upload["parts"][number] for number in sorted(upload["parts"])]
+        # the etag of a multipart object is the md5 of the md5 of its parts
+        etag = f"{hashlib.md5(b''.join(hashlib.md5(part).digest() for part in parts)).hexdigest()}-{len(parts)}"
+        self._store(upload["bucket"], upload["key"], b"".join(parts), etag, upload["metadata"])
+        return xml_response(xml_element("CompleteMultipartUploadResult",
+                                        {"Bucket": upload["bucket"], "Key": upload["key"], "ETag": f'"{etag}"'}))
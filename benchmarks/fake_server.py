@@ -0,0 +1,110 @@
+import json
+import threading
+import time
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Process, Queue
+from urllib.parse import parse_qs, urlsplit
+
+
+def json_response(data, status: int = 200, headers: dict = None) -> tuple[int, dict, bytes]:
+    return status, {"Content-Type": "application/json", **(headers or {})}, json.dumps(data).encode()
+
+
+def html_response(html: str, status: int = 200, headers: dict = None) -> tuple[int, dict, bytes]:
+    return status, {"Content-Type": "text/html; charset=utf-8", **(headers or {})}, html.encode()
+
+
+def redirect(location: str, headers: dict = None) -> tuple[int, dict, bytes]:
+    return 302, {"Location": location, **(headers or {})}, b""
+
+
+def get_cookies(headers) -> dict[str, str]:
+    cookie = SimpleCookie(headers.get("Cookie") or "")
+    return {name: morsel.value for name, morsel in cookie.items()}
+
+
+class FakeApp:
+    """
+    base of the stand-in servers: handle returns the status, the headers and the body of a request,
+    every request is delayed by latency seconds and counted by route
+    """
+
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.calls: dict[str, int] = {}
+        self._lock: threading.Lock = None
+
+    def count(self, route: str):
+        with self._lock:
+            self.calls[route] = self.calls.get(route, 0) + 1
+
+    def handle(self, method: str, path: str, query: dict[str, list[str]], headers,
+               body: bytes) -> tuple[int, dict, bytes]:
+        raise NotImplementedError()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        app: FakeApp = self.server.app
+
+        if url.path == "/__stats":
+            status, headers, payload = json_response(app.calls)
+        else:
+            if app.latency:
+                time.sleep(app.latency)
+            query = parse_qs(url.query, keep_blank_values=True)
+            status, headers, payload = app.handle(self.command, url.path, query, self.headers, body)
+
+        self.send_response(status)
+        for name, value in headers.items():
+            for item in value if isinstance(value, list) else [value]:
+                self.send_header(name, item)
+        # the response to a head request has the content length of the object and no body
+        if "Content-Length" not in headers:
+            self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = _dispatch
+
+
+def _serve(app: FakeApp, port_queue: Queue):
+    app._lock = threading.Lock()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.app = app
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+class FakeServer:
+    """
+    run a stand-in app in a child process, so its cpu time and memory are not measured with the sync
+    """
+
+    def __init__(self, app: FakeApp):
+        self.app = app
+        self.url: str = None
+        self._process: Process = None
+
+    def start(self) -> str:
+        port_queue = Queue()
+        self._process = Process(target=_serve, args=(self.app, port_queue), daemon=True)
+        self._process.start()
+        self.url = f"http://127.0.0.1:{port_queue.get(timeout=30)}"
+        return self.url
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
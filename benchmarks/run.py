@@ -0,0 +1,163 @@
+"""
+offline benchmark of the sync: the provider portals, google drive and google tasks are replaced by local fake
+servers with a configurable latency, the sync runs unchanged against them through BASE_URL_OVERRIDES.
+
+    python -m benchmarks.run [scenario ...] [--invoices N] [--pdf-size BYTES] [--latency S] [--google-latency S]
+                             [--sinks SINK ...]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from dataclasses import dataclass, replace
+from datetime import date, timedelta
+
+from benchmarks.fake_google import FakeGoogle
+from benchmarks.fake_providers import FAKE_PROVIDERS
+from benchmarks.fake_s3 import FakeS3
+from benchmarks.fake_server import FakeServer
+
+GOOGLE_ORIGINS = ["https://www.googleapis.com", "https://tasks.googleapis.com"]
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass
+class Scenario:
+    name: str
+    # invoices of every provider
+    invoices: int
+    pdf_size: int
+    latency: float
+    google_latency: float
+    providers: tuple[str, ...] = tuple(FAKE_PROVIDERS)
+    interval_days: int = 2
+    # storage sinks the invoices are saved to, the local sink writes to the working directory of the sync
+    sinks: tuple[str, ...] = ("drive",)
+    s3_latency: float = 0.005
+
+
+SCENARIOS = {scenario.name: scenario for scenario in [
+    Scenario("smoke", invoices=20, pdf_size=50_000, latency=0.005, google_latency=0.005),
+    Scenario("4x500", invoices=500, pdf_size=150_000, latency=0.02, google_latency=0.05),
+    Scenario("large-pdfs", invoices=30, pdf_size=8_000_000, latency=0.02, google_latency=0.05),
+    Scenario("sinks", invoices=50, pdf_size=150_000, latency=0.02, google_latency=0.05,
+             sinks=("drive", "local", "s3")),
+]}
+
+
+def get_env(scenario: Scenario, provider_urls: dict[str, str], google_url: str,
+            s3_url: str | None) -> dict[str, str]:
+    overrides = [f"{origin}={url}" for provider, url in provider_urls.items() for origin in FAKE_PROVIDERS[provider][1]]
+    overrides += [f"{origin}={google_url}" for origin in GOOGLE_ORIGINS]
+    env = {
+        # the sync is measured without its own rate limits, set them to measure their effect
+        "HTTP_RATE_LIMIT": "0",
+        "GOOGLE_RATE_LIMIT": "0",
+        **os.environ,
+        "BASE_URL_OVERRIDES": ",".join(overrides),
+        "PYTHONPATH": os.pathsep.join(filter(None, [ROOT_PATH, os.getenv("PYTHONPATH")])),
+        "FASTWEB_CLIENT_CODE": "C1",
+        "STORAGE_SINKS": ",".join(scenario.sinks),
+    }
+    if s3_url:
+        env.update({"S3_SINK_ENDPOINT_URL": s3_url, "S3_SINK_BUCKET": "bollette", "S3_SINK_REGION": "us-east-1",
+                    "AWS_ACCESS_KEY_ID": "benchmark", "AWS_SECRET_ACCESS_KEY": "benchmark"})
+    for provider in scenario.providers:
+        env[f"{provider.upper()}_USERNAME"] = f"{provider}@example.com"
+        env[f"{provider.upper()}_PASSWORD"] = "password"
+    return env
+
+
+def run_scenario(scenario: Scenario) -> list[dict]:
+    """
+    start the fake servers and run a cold sync, that uploads every invoice, and a warm one that finds them synced
+    """
+    end_date = date.today()
+    servers = {}
+    for provider in scenario.providers:
+        app_class = FAKE_PROVIDERS[provider][0]
+        kwargs = {"client_codes": ["C1"]} if provider == "fastweb" else {}
+        servers[provider] = FakeServer(app_class(scenario.invoices, scenario.pdf_size, latency=scenario.latency,
+                                                 interval_days=scenario.interval_days, end_date=end_date, **kwargs))
+    servers["google"] = FakeServer(FakeGoogle(latency=scenario.google_latency))
+    if "s3" in scenario.sinks:
+        servers["s3"] = FakeServer(FakeS3(latency=scenario.s3_latency))
+
+    try:
+        server_urls = {name: server.start() for name, server in servers.items()}
+        config = {
+            "providers": list(scenario.providers),
+            "start_date": (end_date - timedelta(days=(scenario.invoices - 1) * scenario.interval_days)).isoformat(),
+            "end_date": end_date.isoformat(),
+            "passes": ["cold", "warm"],
+            "servers": server_urls,
+        }
+        env = get_env(scenario, {provider: server_urls[provider] for provider in scenario.providers},
+                      server_urls["google"], server_urls.get("s3"))
+        with tempfile.TemporaryDirectory(prefix="bolletta_bench_") as work_path:
+            process = subprocess.run([sys.executable, "-m", "benchmarks.worker", json.dumps(config)], cwd=work_path,
+                                     env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if process.returncode != 0:
+            raise Exception(f"scenario {scenario.name} failed:\n{process.stderr}")
+        return json.loads(process.stdout)
+    finally:
+        for server in servers.values():
+            server.stop()
+
+
+def print_report(scenario: Scenario, results: list[dict]):
+    print(f"\n== {scenario.name}: {len(scenario.providers)} providers x {scenario.invoices} invoices, "
+          f"pdf {scenario.pdf_size / 1024:.0f} KiB, latency {scenario.latency * 1000:.0f} ms, "
+          f"google latency {scenario.google_latency * 1000:.0f} ms, sinks {', '.join(scenario.sinks)}")
+    for result in results:
+        print(f"-- {result['pass']}: wall time {result['wall_time']:.2f}s, peak rss {result['peak_rss_mb']:.1f} MiB")
+        for name, calls in result["calls"].items():
+            print(f"   {name} calls: {sum(calls.values())} "
+                  f"({', '.join(f'{route} {count}' for route, count in sorted(calls.items()))})")
+        for name, stage in result["stages"].items():
+            print(f"   stage {name}: {stage['calls']} calls, p50 {stage['p50'] * 1000:.1f} ms, "
+                  f"p95 {stage['p95'] * 1000:.1f} ms, p99 {stage['p99'] * 1000:.1f} ms, "
+                  f"max {stage['max'] * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="offline sync benchmark")
+    parser.add_argument("scenarios", nargs="*", default=["smoke"],
+                        help=f"scenarios to run: {', '.join(SCENARIOS)} (default: smoke)")
+    parser.add_argument("--providers", nargs="+", choices=list(FAKE_PROVIDERS), help="providers to sync")
+    parser.add_argument("--invoices", type=int, help="invoices of every provider")
+    parser.add_argument("--pdf-size", type=int, help="size of every pdf in bytes")
+    parser.add_argument("--latency", type=float, help="latency of the provider portals in seconds")
+    parser.add_argument("--google-latency", type=float, help="latency of the google apis in seconds")
+    parser.add_argument("--sinks", nargs="+", choices=["drive", "local", "s3"], help="storage sinks to save to")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name}")
+
+    overrides = {key: value for key, value in {
+        "providers": tuple(args.providers) if args.providers else None,
+        "invoices": args.invoices,
+        "pdf_size": args.pdf_size,
+        "latency": args.latency,
+        "google_latency": args.google_latency,
+        "sinks": tuple(args.sinks) if args.sinks else None,
+    }.items() if value is not None}
+
+    report = {}
+    for name in args.scenarios:
+        scenario = replace(SCENARIOS[name], **overrides)
+        results = run_scenario(scenario)
+        print_report(scenario, results)
+        report[name] = results
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+run the sync against the fake servers in a process of its own, so its peak rss is measured alone.
+the configuration is the json argument, the results are printed to stdout as json
+"""
+import asyncio
+import json
+import logging
+import resource
+import sys
+import urllib.request
+from datetime import date
+from time import perf_counter
+
+
+def get_calls(server_urls: dict[str, str]) -> dict[str, dict[str, int]]:
+    calls = {}
+    for name, url in server_urls.items():
+        with urllib.request.urlopen(f"{url}/__stats") as response:
+            calls[name] = json.load(response)
+    return calls
+
+
+def diff_calls(before: dict[str, dict[str, int]], after: dict[str, dict[str, int]]) -> dict[str, dict[str, int]]:
+    return {name: {route: count - before.get(name, {}).get(route, 0) for route, count in routes.items()
+                   if count - before.get(name, {}).get(route, 0)}
+            for name, routes in after.items()}
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on linux and in bytes on macos
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def main():
+    config = json.loads(sys.argv[1])
+
+    from google.auth.credentials import AnonymousCredentials
+
+    from bolletta_sync import main as bolletta
+    from bolletta_sync.pipeline import Pipeline, Stage
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    pipelines: list[Pipeline] = []
+
+    class RecordingPipeline(Pipeline):
+        def __init__(self, stages: list[Stage], queue_size: int):
+            super().__init__(stages, queue_size)
+            pipelines.append(self)
+
+    bolletta.Pipeline = RecordingPipeline
+
+    providers = [bolletta.Provider(provider) for provider in config["providers"]]
+    start_date = date.fromisoformat(config["start_date"])
+    end_date = date.fromisoformat(config["end_date"])
+
+    async def run_pass():
+        context = bolletta.create_sync_context(AnonymousCredentials())
+        try:
+            await bolletta.run_sync(context, providers, start_date, end_date)
+        finally:
+            await bolletta.close_sync_context(context)
+
+    results = []
+    for name in config["passes"]:
+        pipelines.clear()
+        calls = get_calls(config["servers"])
+        started_at = perf_counter()
+        asyncio.run(run_pass())
+        wall_time = perf_counter() - started_at
+
+        stages = {}
+        for pipeline in pipelines:
+            for stage in pipeline.stages:
+                stages.setdefault(stage.name, Stage(stage.name, stage.func)).latencies.extend(stage.latencies)
+        results.append({
+            "pass": name,
+            "wall_time": wall_time,
+            "peak_rss_mb": peak_rss_mb(),
+            "calls": diff_calls(calls, get_calls(config["servers"])),
+            "stages": {name: {"calls": len(stage.latencies), "p50": stage.percentile(50),
+                              "p95": stage.percentile(95), "p99": stage.percentile(99),
+                              "max": max(stage.latencies, default=0)}
+                       for name, stage in stages.items()},
+        })
+
+    json.dump(results, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import argparse
+import asyncio
+from datetime import date
+
+from bolletta_sync.main import Provider, main
+
+
+def run():
+    parser = argparse.ArgumentParser(prog="bolletta-sync", description="Sync the utility invoices to Google Drive")
+    parser.add_argument("--providers", nargs="+", choices=[provider.value for provider in Provider],
+                        help="providers to sync, all by default")
+    parser.add_argument("--start-date", type=date.fromisoformat, help="start date (YYYY-MM-DD)")
+    parser.add_argument("--end-date", type=date.fromisoformat, help="end date (YYYY-MM-DD)")
+    parser.add_argument("--verify", action="store_true",
+                        help="reconcile the local ledger with the storage sinks before syncing")
+    parser.add_argument("--backfill", action="store_true",
+                        help="sync a range of several years, resuming the years completed by a previous backfill")
+    parser.add_argument("--resume", metavar="RUN_ID",
+                        help="run again the providers that did not complete a previous run")
+    parser.add_argument("--daemon", action="store_true",
+                        help="run as a service that syncs the providers on their schedules")
+    args = parser.parse_args()
+    if args.backfill and args.start_date is None:
+        parser.error("--backfill requires --start-date")
+
+    if args.daemon:
+        from bolletta_sync.daemon import serve
+        asyncio.run(serve())
+        return
+
+    providers = [Provider(provider) for provider in args.providers] if args.providers else None
+    asyncio.run(main(providers, args.start_date, args.end_date, verify_ledger=args.verify,
+                     backfill=args.backfill, resume_run_id=args.resume))
+
+
+if __name__ == "__main__":
+    run()
@@ -2,19 +2,33 @@ import asyncio
 import logging
 import os.path
 import tomllib
+from collections import deque
 from datetime import date, datetime, timedelta
 from logging import StreamHandler
-from threading import Thread
+from threading import Lock, Thread
 
 import customtkinter as ctk
 
 from bolletta_sync.main import Provider, main, logger, pyproject, base_path
+from bolletta_sync.progress import SyncProgress
+
+GUI_LOG_LINES = int(os.getenv("GUI_LOG_LINES", "2000"))
+GUI_REFRESH_INTERVAL = int(os.getenv("GUI_REFRESH_INTERVAL", "100"))
 
 
 class TextBoxHandler(StreamHandler):
-    def __init__(self, text_widget):
+    """
+    log handler that queues the records from any thread, the text box is updated in batches by flush_pending on
+    the tk thread and keeps only the last max_lines lines
+    """
+
+    def __init__(self, text_widget, max_lines: int = GUI_LOG_LINES):
         StreamHandler.__init__(self)
         self.text_widget = text_widget
+        self.max_lines = max_lines
+        self._pending = deque(maxlen=max_lines)
+        self._pending_lock = Lock()
+        self._dropped = 0
         self.setFormatter(logger.handlers[0].formatter)
 
     def emit(self, record):
@@ -23,12 +37,30 @@ class TextBoxHandler(StreamHandler):
                 if isinstance(arg, Exception):
                     record.exc_info = (type(arg), arg, arg.__traceback__)
                     break
-        msg = self.format(record) + '\n'
-        self.text_widget.after(0, self.append_text, msg)
+        msg = self.format(record)
+        with self._pending_lock:
+            # the lines queued beyond max_lines would be trimmed from the text box anyway
+            if len(self._pending) == self._pending.maxlen:
+                self._dropped += 1
+            self._pending.append(msg)
+
+    def flush_pending(self):
+        with self._pending_lock:
+            lines = list(self._pending)
+            self._pending.clear()
+            dropped = self._dropped
+            self._dropped = 0
+        if dropped:
+            lines.insert(0, f"... {dropped} lines skipped")
+        if lines:
+            self.append_text("\n".join(lines) + "\n")
 
     def append_text(self, msg):
         self.text_widget.configure(state="normal")
         self.text_widget.insert("end", msg)
+        line_count = int(self.text_widget.index("end-1c").split(".")[0])
+        if line_count > self.max_lines:
+            self.text_widget.delete("1.0", f"{line_count - self.max_lines + 1}.0")
         self.text_widget.configure(state="disabled")
         self.text_widget.see("end")
 
@@ -38,6 +70,8 @@ class App(ctk.CTk):
         super().__init__()
 
         self.is_syncing = False
+        self.progress: SyncProgress = None
+        self.progress_rows: dict[str, tuple[ctk.CTkProgressBar, ctk.CTkLabel]] = {}
 
         self.title("Bolletta Sync")
         self.geometry("800x700")
@@ -50,7 +84,7 @@ class App(ctk.CTk):
                 pass
 
         self.grid_columnconfigure(0, weight=1)
-        self.grid_rowconfigure(3, weight=1)
+        self.grid_rowconfigure(5, weight=1)
 
         # Date Group
         self.date_frame = ctk.CTkFrame(self)
@@ -76,6 +110,13 @@ class App(ctk.CTk):
         self.end_date.insert(0, date.today().isoformat())
         self.end_date.bind("<KeyRelease>", lambda e: self.validate_form())
 
+        self.cb_incremental = ctk.CTkCheckBox(self.date_frame, text="Since last sync", command=self.on_incremental_changed)
+        self.cb_incremental.grid(row=3, column=0, columnspan=2, padx=10, pady=5, sticky="w")
+        self.cb_incremental.select()
+
+        self.cb_backfill = ctk.CTkCheckBox(self.date_frame, text="Backfill (resume the completed years)")
+        self.cb_backfill.grid(row=4, column=0, columnspan=2, padx=10, pady=(5, 10), sticky="w")
+
         # Providers Group
         self.providers_frame = ctk.CTkFrame(self)
         self.providers_frame.grid(row=1, column=0, padx=20, pady=10, sticky="ew")
@@ -95,14 +136,21 @@ class App(ctk.CTk):
                                       font=ctk.CTkFont(size=14, weight="bold"))
         self.btn_sync.grid(row=2, column=0, padx=20, pady=10, sticky="ew")
 
+        # Progress Group
+        self.progress_frame = ctk.CTkFrame(self)
+        self.progress_frame.grid(row=3, column=0, padx=20, pady=10, sticky="ew")
+        self.progress_frame.grid_columnconfigure(2, weight=1)
+        self.progress_frame.grid_remove()
+
         # Log Area
-        ctk.CTkLabel(self, text="Output:").grid(row=3, column=0, padx=20, pady=(10, 0), sticky="nw")
+        ctk.CTkLabel(self, text="Output:").grid(row=4, column=0, padx=20, pady=(10, 0), sticky="nw")
         self.log_area = ctk.CTkTextbox(self)
-        self.log_area.grid(row=4, column=0, padx=20, pady=(5, 10), sticky="nsew")
+        self.log_area.grid(row=5, column=0, padx=20, pady=(5, 10), sticky="nsew")
         self.log_area.insert("0.0", "Your sync logs will appear here...\n")
         self.log_area.configure(state="disabled")
 
-        logger.addHandler(TextBoxHandler(self.log_area))
+        self.log_handler = TextBoxHandler(self.log_area)
+        logger.addHandler(self.log_handler)
 
         # Version
         try:
@@ -112,8 +160,50 @@ class App(ctk.CTk):
             version = "Unknown"
 
         self.lbl_version = ctk.CTkLabel(self, text=f"Version: {version}", text_color="gray")
-        self.lbl_version.grid(row=5, column=0, padx=20, pady=(0, 10), sticky="e")
+        self.lbl_version.grid(row=6, column=0, padx=20, pady=(0, 10), sticky="e")
+
+        self.on_incremental_changed()
+        self.after(GUI_REFRESH_INTERVAL, self.refresh)
 
+    def refresh(self):
+        """
+        update the log area and the progress bars on a fixed interval, whatever the rate of the log records
+        """
+        self.log_handler.flush_pending()
+        self.render_progress()
+        self.after(GUI_REFRESH_INTERVAL, self.refresh)
+
+    def render_progress(self):
+        if self.progress is None:
+            return
+        for provider_progress in self.progress.snapshot():
+            row = self.progress_rows.get(provider_progress.provider)
+            if row is not None:
+                progress_bar, lbl_status = row
+                progress_bar.set(provider_progress.fraction)
+                lbl_status.configure(text=str(provider_progress))
+
+    def show_progress(self, providers: list[Provider]):
+        for widget in self.progress_frame.winfo_children():
+            widget.destroy()
+        self.progress_rows = {}
+        for row, provider in enumerate(providers):
+            ctk.CTkLabel(self.progress_frame, text=str(provider.value).replace("_", " ").title()).grid(
+                row=row, column=0, padx=10, pady=5, sticky="w")
+            progress_bar = ctk.CTkProgressBar(self.progress_frame, width=160)
+            progress_bar.set(0)
+            progress_bar.grid(row=row, column=1, padx=10, pady=5, sticky="w")
+            lbl_status = ctk.CTkLabel(self.progress_frame, text="waiting", text_color="gray")
+            lbl_status.grid(row=row, column=2, padx=10, pady=5, sticky="w")
+            self.progress_rows[provider.value] = (progress_bar, lbl_status)
+        self.progress = SyncProgress([provider.value for provider in providers])
+        self.progress_frame.grid()
+
+    def on_incremental_changed(self):
+        self.start_date.configure(state="disabled" if self.cb_incremental.get() == 1 else "normal")
+        if self.cb_incremental.get() == 1:
+            self.cb_backfill.deselect()
+        self.cb_backfill.configure(state="disabled" if self.cb_incremental.get() == 1 else "normal")
         self.validate_form()
 
     def validate_form(self):
@@ -122,9 +212,12 @@ class App(ctk.CTk):
             return
 
         try:
-            s_date = datetime.strptime(self.start_date.get(), "%Y-%m-%d").date()
             e_date = datetime.strptime(self.end_date.get(), "%Y-%m-%d").date()
-            is_date_valid = e_date > s_date
+            if self.cb_incremental.get() == 1:
+                is_date_valid = True
+            else:
+                s_date = datetime.strptime(self.start_date.get(), "%Y-%m-%d").date()
+                is_date_valid = e_date > s_date
         except ValueError:
             is_date_valid = False
 
@@ -137,6 +230,10 @@ class App(ctk.CTk):
 
     def on_sync_finished(self):
         self.is_syncing = False
+        # the last records of the sync are shown before the progress is released
+        self.log_handler.flush_pending()
+        self.render_progress()
+        self.progress = None
         self.validate_form()
 
     def exec_sync(self):
@@ -144,8 +241,11 @@ class App(ctk.CTk):
         self.validate_form()
 
         try:
-            selected_start_date = datetime.strptime(self.start_date.get(), "%Y-%m-%d").date()
+            selected_start_date = None
+            if self.cb_incremental.get() != 1:
+                selected_start_date = datetime.strptime(self.start_date.get(), "%Y-%m-%d").date()
             selected_end_date = datetime.strptime(self.end_date.get(), "%Y-%m-%d").date()
+            selected_backfill = self.cb_backfill.get() == 1
         except ValueError:
             self.on_sync_finished()
             return
@@ -158,10 +258,13 @@ class App(ctk.CTk):
         self.log_area.configure(state="normal")
         self.log_area.delete("0.0", "end")
         self.log_area.configure(state="disabled")
+        self.show_progress(selected_providers)
+        progress = self.progress
 
         def run_process():
             try:
-                asyncio.run(main(selected_providers, selected_start_date, selected_end_date))
+                asyncio.run(main(selected_providers, selected_start_date, selected_end_date,
+                                 backfill=selected_backfill, progress=progress))
             except Exception as e:
                 logger.exception("Error during sync")
             finally:
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+
+from playwright.async_api import async_playwright, Browser, BrowserContext, Playwright
+
+from bolletta_sync.main import logger
+
+
+class LazyBrowser:
+    """
+    chromium browser launched only when the first page is requested
+    """
+
+    def __init__(self, headless: bool = True):
+        self._headless = headless
+        self._playwright: Playwright = None
+        self._browser: Browser = None
+        self._lock = asyncio.Lock()
+
+    async def get_browser(self) -> Browser:
+        async with self._lock:
+            if self._browser is None:
+                logger.info("Launching chromium")
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=self._headless)
+        return self._browser
+
+    async def new_context(self, **kwargs) -> BrowserContext:
+        """
+        return a new isolated browser context, with its own cookies and storage
+        """
+        browser = await self.get_browser()
+        return await browser.new_context(**kwargs)
+
+    async def close(self):
+        if self._browser is not None:
+            await self._browser.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+        self._browser = None
+        self._playwright = None
+
+
+class BrowserRecording:
+    """
+    playwright trace (screenshots, dom snapshots, network timing) and har of a browser context, recorded in its own
+    folder. the recording is kept only when asked, beyond keep recordings the oldest ones are removed
+    """
+
+    def __init__(self, path: str, name: str, keep: int):
+        self._path = path
+        self._keep = keep
+        self._browser_context: BrowserContext = None
+        # the folders sort by their timestamp
+        self.folder = os.path.join(path, f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{name}_{uuid.uuid4().hex[:6]}")
+        os.makedirs(self.folder, exist_ok=True)
+
+    def context_options(self) -> dict:
+        """
+        options of the new browser context that record its har, the timings without the response bodies
+        """
+        return {"record_har_path": os.path.join(self.folder, "network.har"), "record_har_content": "omit"}
+
+    async def start(self, browser_context: BrowserContext):
+        self._browser_context = browser_context
+        await browser_context.tracing.start(screenshots=True, snapshots=True)
+
+    async def stop(self, keep: bool):
+        """
+        stop the trace before the browser context is closed, it is written only when kept
+        """
+        if self._browser_context is not None:
+            await self._browser_context.tracing.stop(path=os.path.join(self.folder, "trace.zip") if keep else None)
+
+    def finish(self, keep: bool, info: dict):
+        """
+        once the browser context is closed its har is written: keep the folder, described by info.json, or remove it
+        """
+        if not keep:
+            shutil.rmtree(self.folder, ignore_errors=True)
+            return
+
+        with open(os.path.join(self.folder, "info.json"), "w") as f:
+            json.dump(info, f, indent=2)
+        logger.info(f"Browser recording kept in {self.folder}")
+
+        # only the finished recordings have an info.json, the ones of the accounts still syncing are left alone
+        folders = sorted(name for name in os.listdir(self._path)
+                         if os.path.isfile(os.path.join(self._path, name, "info.json")))
+        for name in folders[:-self._keep] if self._keep > 0 else []:
+            shutil.rmtree(os.path.join(self._path, name), ignore_errors=True)
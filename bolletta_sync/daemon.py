@@ -0,0 +1,244 @@
+import asyncio
+import json
+import os
+import socket
+from datetime import date, datetime, timedelta, timezone
+
+from google.auth.transport.requests import Request as AuthRequest
+from google.oauth2.credentials import Credentials
+
+from bolletta_sync.main import (Provider, SyncContext, base_path, close_sync_context, create_sync_context,
+                                get_google_credentials, google_token_file, logger, run_sync)
+
+DAEMON_SCHEDULE = os.getenv("DAEMON_SCHEDULE", "0 6 * * *")
+# the control socket is readable and writable only by the user running the daemon
+DAEMON_SOCKET = os.getenv("DAEMON_SOCKET") or os.path.join(base_path, "bolletta_sync.sock")
+# without unix sockets, e.g. on older windows, the daemon listens on this local port instead
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = int(os.getenv("DAEMON_PORT", "8765"))
+GOOGLE_TOKEN_REFRESH_MARGIN = int(os.getenv("GOOGLE_TOKEN_REFRESH_MARGIN", "300"))
+
+
+class CronSchedule:
+    """
+    cron expression with the five fields minute, hour, day of month, month and day of week. every field is *,
+    a value, a range a-b, with an optional step /n, or a comma separated list of them
+    """
+
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"invalid cron expression: {expression}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self.FIELDS))
+        # sunday is both 0 and 7
+        if 7 in self.weekdays:
+            self.weekdays = (self.weekdays - {7}) | {0}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> set[int]:
+        values = set()
+        for part in field.split(","):
+            part_range, _, step = part.partition("/")
+            if part_range == "*":
+                start, end = low, high
+            elif "-" in part_range:
+                start, end = map(int, part_range.split("-"))
+            else:
+                start = int(part_range)
+                end = high if step else start
+            values.update(range(start, end + 1, int(step) if step else 1))
+        if not values or min(values) < low or max(values) > high:
+            raise ValueError(f"invalid cron field: {field}")
+        return values
+
+    def _match_day(self, moment: datetime) -> bool:
+        day_match = moment.day in self.days
+        weekday_match = (moment.weekday() + 1) % 7 in self.weekdays
+        # like cron, a restricted day of month and day of week match either of them
+        if self._any_day or self._any_weekday:
+            return day_match and weekday_match
+        return day_match or weekday_match
+
+    def next_run(self, after: datetime) -> datetime:
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=4 * 366)
+        while moment < limit:
+            if moment.month not in self.months or not self._match_day(moment):
+                moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+            elif moment.hour not in self.hours:
+                moment = (moment + timedelta(hours=1)).replace(minute=0)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"cron expression never matches: {self.expression}")
+
+
+def get_schedules() -> dict[Provider, CronSchedule]:
+    """
+    return the schedule of every provider, DAEMON_SCHEDULE unless overridden by <PROVIDER>_SCHEDULE.
+    a provider scheduled "off" is synced only on demand
+    """
+    schedules = {}
+    for provider in Provider:
+        expression = os.getenv(f"{provider.value.upper()}_SCHEDULE", DAEMON_SCHEDULE)
+        if expression != "off":
+            schedules[provider] = CronSchedule(expression)
+    return schedules
+
+
+class Daemon:
+    """
+    long-running sync service: the providers are synced on their schedules, or on demand through the local control
+    socket, reusing the same chromium instance, google credentials and provider sessions. the drive and tasks
+    indexes are kept too and refreshed at the start of every run
+    """
+
+    def __init__(self, context: SyncContext, google_credentials: Credentials,
+                 schedules: dict[Provider, CronSchedule]):
+        self._context = context
+        self._google_credentials = google_credentials
+        self._schedules = schedules
+        self._next_runs: dict[Provider, datetime] = {}
+        self._running: set[Provider] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+    async def run(self):
+        # keep chromium warm for the providers that still need the browser login
+        await self._context.browser.get_browser()
+
+        server = await self._start_server()
+        async with server:
+            async with asyncio.TaskGroup() as task_group:
+                task_group.create_task(self._refresh_credentials())
+                for provider, schedule in self._schedules.items():
+                    task_group.create_task(self._run_schedule(provider, schedule))
+
+    async def _start_server(self) -> asyncio.Server:
+        if not hasattr(socket, "AF_UNIX"):
+            server = await asyncio.start_server(self._handle_client, DAEMON_HOST, DAEMON_PORT)
+            logger.info(f"Daemon listening on {DAEMON_HOST}:{DAEMON_PORT}")
+            return server
+
+        # the umask keeps the socket private from its creation, before the chmod
+        umask = os.umask(0o077)
+        try:
+            server = await asyncio.start_unix_server(self._handle_client, DAEMON_SOCKET)
+        finally:
+            os.umask(umask)
+        os.chmod(DAEMON_SOCKET, 0o600)
+        logger.info(f"Daemon listening on {DAEMON_SOCKET}")
+        return server
+
+    async def _run_schedule(self, provider: Provider, schedule: CronSchedule):
+        while True:
+            next_run = schedule.next_run(datetime.now())
+            self._next_runs[provider] = next_run
+            logger.info(f"{provider.value} - Next sync at {next_run}")
+            await asyncio.sleep((next_run - datetime.now()).total_seconds())
+            self.trigger([provider])
+
+    async def _refresh_credentials(self):
+        """
+        refresh the google token before it expires, so no call waits for the refresh
+        """
+        while True:
+            expiry = self._google_credentials.expiry
+            if expiry is not None:
+                # the expiry of google credentials is a naive utc datetime
+                now = datetime.now(timezone.utc).replace(tzinfo=None)
+                await asyncio.sleep(max((expiry - now).total_seconds() - GOOGLE_TOKEN_REFRESH_MARGIN, 0))
+            try:
+                await asyncio.to_thread(self._google_credentials.refresh, AuthRequest())
+                with open(google_token_file, "w") as token:
+                    token.write(self._google_credentials.to_json())
+                logger.info(f"Google credentials refreshed, valid until {self._google_credentials.expiry}")
+            except Exception as e:
+                logger.error(f"Google credentials refresh failed cause: {e}")
+                await asyncio.sleep(60)
+            if expiry is None:
+                await asyncio.sleep(GOOGLE_TOKEN_REFRESH_MARGIN)
+
+    def trigger(self, providers: list[Provider], **kwargs) -> dict[str, str]:
+        """
+        start the sync of the providers that are not already syncing
+        """
+        result = {}
+        for provider in providers:
+            if provider in self._running:
+                logger.info(f"{provider.value} - Sync already running, skipped")
+                result[provider.value] = "running"
+                continue
+            self._running.add(provider)
+            task = asyncio.create_task(self._sync(provider, **kwargs))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            result[provider.value] = "started"
+        return result
+
+    async def _sync(self, provider: Provider, **kwargs):
+        try:
+            await run_sync(self._context, [provider], **kwargs)
+        except Exception as e:
+            logger.error(f"{provider.value} - Scheduled sync failed cause: {e}")
+        finally:
+            self._running.discard(provider)
+
+    def status(self) -> dict:
+        return {
+            "running": [provider.value for provider in self._running],
+            "next_runs": {provider.value: next_run.isoformat() for provider, next_run in self._next_runs.items()},
+        }
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        serve the json commands of the control socket, one per line:
+        {"command": "status"} or {"command": "sync", "providers": [...], "start_date": ..., "end_date": ...}
+        """
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("the request must be a json object")
+                    if request.get("command") == "status":
+                        response = self.status()
+                    elif request.get("command") == "sync":
+                        providers = request.get("providers") or [provider.value for provider in Provider]
+                        if not isinstance(providers, list):
+                            raise ValueError("providers must be a list")
+                        start_date = request.get("start_date")
+                        end_date = request.get("end_date")
+                        for value in (start_date, end_date):
+                            if value is not None and not isinstance(value, str):
+                                raise ValueError("the dates must be iso formatted strings")
+                        if request.get("backfill") and not start_date:
+                            raise ValueError("backfill requires a start date")
+                        response = self.trigger(
+                            [Provider(provider) for provider in providers],
+                            start_date=date.fromisoformat(start_date) if start_date else None,
+                            end_date=date.fromisoformat(end_date) if end_date else None,
+                            backfill=bool(request.get("backfill")))
+                    else:
+                        response = {"error": f"unknown command {request.get('command')}"}
+                except (ValueError, TypeError, AttributeError) as e:
+                    response = {"error": str(e)}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+async def serve():
+    google_credentials = await get_google_credentials()
+    context = create_sync_context(google_credentials)
+    try:
+        await Daemon(context, google_credentials, get_schedules()).run()
+    finally:
+        await close_sync_context(context)
@@ -0,0 +1,67 @@
+from bolletta_sync.google_gateway import GoogleGateway
+
+DRIVE_PAGE_SIZE = 1000
+
+
+class DriveIndex:
+    """
+    in-memory index of the files of a google drive folder, keyed by file name and by md5 checksum
+    """
+
+    def __init__(self, google_gateway: GoogleGateway, folder_id: str):
+        self._google_gateway = google_gateway
+        self.folder_id = folder_id
+        self._files: dict[str, dict] = {}
+        self._checksums: dict[str, dict] = {}
+        # the files added while the folder is listed again
+        self._added: list[dict] | None = None
+
+    async def load(self):
+        """
+        list the whole folder, following the pagination. a loaded index is replaced once the listing is complete,
+        together with the files added in the meantime
+        """
+        drive_service = self._google_gateway.drive_service
+        files = []
+        self._added = []
+        try:
+            page_token = None
+            while True:
+                results = await self._google_gateway.execute(drive_service.files().list(
+                    q=f"'{self.folder_id}' in parents and trashed=false",
+                    spaces='drive',
+                    fields="nextPageToken, files(id, name, size, md5Checksum)",
+                    pageSize=DRIVE_PAGE_SIZE,
+                    pageToken=page_token
+                ))
+                files.extend(results.get('files', []))
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    break
+            files.extend(self._added)
+        finally:
+            self._added = None
+
+        self._files = {}
+        self._checksums = {}
+        for file in files:
+            self.add(file)
+
+    def get(self, file_name: str) -> dict | None:
+        return self._files.get(file_name)
+
+    def get_by_md5(self, md5_checksum: str) -> dict | None:
+        return self._checksums.get(md5_checksum)
+
+    def add(self, file: dict):
+        self._files[file['name']] = file
+        if file.get('md5Checksum'):
+            self._checksums[file['md5Checksum']] = file
+        if self._added is not None:
+            self._added.append(file)
+
+    def __contains__(self, file_name: str) -> bool:
+        return file_name in self._files
+
+    def __len__(self) -> int:
+        return len(self._files)
@@ -0,0 +1,12 @@
+from importlib.metadata import EntryPoint, entry_points
+
+
+def load_entry_points(group: str, builtins: dict[str, str]) -> dict[str, EntryPoint]:
+    """
+    return the entry points of the group, the built-in ones followed by the ones of the installed plugins.
+    the built-in ones are also available when the package metadata is missing, e.g. in the bundled app.
+    the modules are not imported
+    """
+    points = {name: EntryPoint(name=name, value=value, group=group) for name, value in builtins.items()}
+    points.update({entry_point.name: entry_point for entry_point in entry_points(group=group)})
+    return points
@@ -0,0 +1,230 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httplib2
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+from bolletta_sync import tracing
+from bolletta_sync.http_client import IDEMPOTENT_METHODS, override_url
+from bolletta_sync.resilience import AdaptiveLimiter, RETRY_ATTEMPTS, TokenBucket, backoff_delay, parse_retry_after
+
+GOOGLE_MAX_WORKERS = int(os.getenv("GOOGLE_MAX_WORKERS", "8"))
+GOOGLE_BATCH_SIZE = int(os.getenv("GOOGLE_BATCH_SIZE", "50"))
+GOOGLE_UPLOAD_RETRIES = int(os.getenv("GOOGLE_UPLOAD_RETRIES", "5"))
+GOOGLE_RATE_LIMIT = float(os.getenv("GOOGLE_RATE_LIMIT", "10"))
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+RETRY_ERRORS = (HttpError, httplib2.HttpLib2Error, OSError)
+# errors raised before the request reached google
+CONNECT_ERRORS = (httplib2.ServerNotFoundError, ConnectionRefusedError, socket.gaierror)
+
+
+def is_throttled(error: Exception) -> bool:
+    """
+    whether google rejected the request because of its rate limits
+    """
+    if not isinstance(error, HttpError):
+        return False
+    if error.status_code == 429:
+        return True
+    return error.status_code == 403 and isinstance(error.error_details, list) and any(
+        isinstance(detail, dict) and detail.get("reason") in RATE_LIMIT_REASONS for detail in error.error_details)
+
+
+def is_retryable(error: Exception, idempotent: bool = True) -> bool:
+    """
+    whether the request can be sent again. a request that is not idempotent, e.g. an insert, may have been processed
+    by google before a server or network error, it is retried only when throttled or when it could not connect
+    """
+    if isinstance(error, HttpError):
+        return is_throttled(error) or (idempotent and error.status_code >= 500)
+    if isinstance(error, CONNECT_ERRORS):
+        return True
+    return idempotent and isinstance(error, RETRY_ERRORS)
+
+
+def is_idempotent(request: HttpRequest) -> bool:
+    return request.method in IDEMPOTENT_METHODS
+
+
+def get_retry_after(error: Exception) -> float | None:
+    if isinstance(error, HttpError):
+        return parse_retry_after(error.resp.get("retry-after"))
+    return None
+
+
+class _Http(httplib2.Http):
+    """
+    httplib2 transport that sends the google api calls to the base urls of BASE_URL_OVERRIDES
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # a resumable upload answers 308 to every chunk but the last one, like build_http of googleapiclient
+        self.redirect_codes = self.redirect_codes - {308}
+
+    def request(self, uri, *args, **kwargs):
+        return super().request(override_url(uri), *args, **kwargs)
+
+
+class GoogleGateway:
+    """
+    run the google api calls off the event loop on a bounded pool of worker threads. the calls are rate limited,
+    run with an adaptive concurrency limit and are retried with backoff on network, server and rate limit errors
+    """
+
+    def __init__(self, google_credentials: Credentials, max_workers: int = GOOGLE_MAX_WORKERS,
+                 batch_size: int = GOOGLE_BATCH_SIZE, rate_limit: float = GOOGLE_RATE_LIMIT,
+                 max_retries: int = RETRY_ATTEMPTS):
+        self._google_credentials = google_credentials
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="google")
+        self._local = threading.local()
+        self._batch_size = batch_size
+        self._limiter = AdaptiveLimiter(max_workers)
+        self._bucket = TokenBucket(rate_limit)
+        self._max_retries = max_retries
+
+        self.drive_service = build("drive", "v3", credentials=self._google_credentials, cache_discovery=False)
+        self.tasks_service = build("tasks", "v1", credentials=self._google_credentials, cache_discovery=False)
+
+    def _get_http(self) -> AuthorizedHttp:
+        # httplib2 is not thread safe, every worker gets its own transport
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = AuthorizedHttp(self._google_credentials, http=_Http())
+            self._local.http = http
+        return http
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _on_error(self, error: Exception) -> float | None:
+        """
+        shrink the concurrency when google throttles, return the seconds to wait before the retry
+        """
+        retry_after = get_retry_after(error)
+        if is_throttled(error):
+            self._limiter.on_throttle()
+            if retry_after is not None:
+                self._bucket.defer(retry_after)
+        return retry_after
+
+    async def _call(self, func, idempotent: bool = True):
+        attempt = 0
+        while True:
+            attempt += 1
+            await self._bucket.acquire()
+            tracing.count("google_calls")
+            async with self._limiter:
+                try:
+                    result = await self._run(func)
+                    self._limiter.on_success()
+                    return result
+                except RETRY_ERRORS as e:
+                    if attempt > self._max_retries or not is_retryable(e, idempotent):
+                        raise e
+                    error = e
+            await asyncio.sleep(backoff_delay(attempt, self._on_error(error)))
+
+    async def execute(self, request: HttpRequest) -> dict:
+        return await self._call(lambda: request.execute(http=self._get_http()), is_idempotent(request))
+
+    async def execute_resumable(self, request: HttpRequest, max_retries: int = GOOGLE_UPLOAD_RETRIES) -> dict:
+        """
+        execute a resumable upload chunk by chunk, after a network or server error the upload
+        resumes from the last chunk acknowledged on its upload session
+        """
+        loop = asyncio.get_running_loop()
+        # the worker thread does not see the current span, its http requests are counted here:
+        # the request that opens the upload session and one per chunk
+        calls = 1
+
+        def upload() -> dict:
+            nonlocal calls
+            http = self._get_http()
+            response = None
+            retries = 0
+            while response is None:
+                try:
+                    calls += 1
+                    _, response = request.next_chunk(http=http)
+                    retries = 0
+                except RETRY_ERRORS as e:
+                    retries += 1
+                    if retries > max_retries or not is_retryable(e):
+                        raise e
+                    retry_after = get_retry_after(e)
+                    if is_throttled(e):
+                        loop.call_soon_threadsafe(self._on_error, e)
+                    time.sleep(backoff_delay(retries, retry_after))
+            return response
+
+        await self._bucket.acquire()
+        async with self._limiter:
+            try:
+                response = await self._run(upload)
+            finally:
+                tracing.count("google_calls", calls)
+            self._limiter.on_success()
+            return response
+
+    async def execute_batch(self, service, requests: list[HttpRequest], return_exceptions: bool = False) -> list:
+        """
+        execute independent requests of the same service in google batch http requests, the requests failed
+        with a retryable error are sent again in a new batch. with return_exceptions the failed requests return
+        their exception instead of raising it. a throttled batch shrinks the concurrency once
+        """
+        responses = [None] * len(requests)
+        errors = []
+        pending = list(range(len(requests)))
+        attempt = 0
+        while pending:
+            attempt += 1
+            failures = {}
+
+            def callback(request_id, response, exception):
+                if exception is not None:
+                    failures[int(request_id)] = exception
+                else:
+                    responses[int(request_id)] = response
+
+            def execute_chunk(indexes: list[int]):
+                batch = service.new_batch_http_request(callback=callback)
+                for i in indexes:
+                    batch.add(requests[i], request_id=str(i))
+                batch.execute(http=self._get_http())
+
+            chunks = [pending[start:start + self._batch_size] for start in range(0, len(pending), self._batch_size)]
+            await asyncio.gather(*(self._call(lambda indexes=indexes: execute_chunk(indexes),
+                                              all(is_idempotent(requests[i]) for i in indexes))
+                                   for indexes in chunks))
+
+            pending = sorted(i for i, exception in failures.items()
+                             if attempt <= self._max_retries and is_retryable(exception, is_idempotent(requests[i])))
+            for i, exception in failures.items():
+                if i not in pending:
+                    responses[i] = exception
+                    errors.append(exception)
+            if pending:
+                retry_errors = [failures[i] for i in pending]
+                throttled = [error for error in retry_errors if is_throttled(error)]
+                if throttled:
+                    self._on_error(max(throttled, key=lambda error: get_retry_after(error) or 0))
+                retry_after = max(get_retry_after(error) or 0 for error in retry_errors)
+                await asyncio.sleep(backoff_delay(attempt, retry_after))
+
+        if errors and not return_exceptions:
+            raise errors[0]
+
+        return responses
+
+    def close(self):
+        self._executor.shutdown(wait=False)
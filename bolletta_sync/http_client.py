@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import os
+import weakref
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import httpx
+
+from bolletta_sync import tracing
+from bolletta_sync.resilience import AdaptiveLimiter, RETRY_ATTEMPTS, TokenBucket, backoff_delay, parse_retry_after
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "4"))
+HTTP_RATE_LIMIT = float(os.getenv("HTTP_RATE_LIMIT", "10"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+# responses retried for every method, the request was not processed by the server
+THROTTLE_STATUS_CODES = {429, 503}
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+# origins served from another base url, e.g. local stand-in servers: "https://fastweb.it=http://127.0.0.1:8001,..."
+BASE_URL_OVERRIDES = dict(override.split("=", 1) for override in os.getenv("BASE_URL_OVERRIDES", "").split(",")
+                          if "=" in override)
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# the limits of every host, shared by the clients of all the providers and accounts running on the same event loop
+_host_policies: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, tuple[AdaptiveLimiter, TokenBucket]]] = (
+    weakref.WeakKeyDictionary())
+
+
+def override_url(url: str) -> str:
+    """
+    return the url on the base url configured for its origin in BASE_URL_OVERRIDES, the url itself otherwise
+    """
+    for origin, base_url in BASE_URL_OVERRIDES.items():
+        if url == origin or url.startswith((f"{origin}/", f"{origin}?")):
+            return base_url + url[len(origin):]
+    return url
+
+
+class HttpClient:
+    """
+    async http client with pooled keep-alive connections. the requests to every host are rate limited, run with an
+    adaptive concurrency limit and are retried with backoff on network errors and throttled or failed responses.
+    the rate and the concurrency limit of a host are shared by all the clients
+    """
+
+    def __init__(self, max_connections: int = HTTP_MAX_CONNECTIONS,
+                 max_connections_per_host: int = HTTP_MAX_CONNECTIONS_PER_HOST,
+                 host_limits: dict[str, int] = None, rate_limit: float = HTTP_RATE_LIMIT,
+                 max_retries: int = RETRY_ATTEMPTS):
+        self._client = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._max_connections = max_connections
+        self._max_connections_per_host = max_connections_per_host
+        self._host_limits = host_limits or {}
+        self._rate_limit = rate_limit
+        self._max_retries = max_retries
+
+    def set_cookies(self, cookies: list[dict]):
+        """
+        copy the cookies of a playwright browser context into the client cookie jar
+        """
+        for cookie in cookies:
+            self._client.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain", ""),
+                                     path=cookie.get("path", "/"))
+
+    def get_cookies(self) -> list[dict]:
+        """
+        return the cookies of the client in the playwright format
+        """
+        return [{
+            "name": cookie.name,
+            "value": cookie.value,
+            "domain": cookie.domain,
+            "path": cookie.path or "/",
+            "expires": cookie.expires or -1,
+            "httpOnly": False,
+            "secure": cookie.secure,
+            "sameSite": "Lax"
+        } for cookie in self._client.cookies.jar if cookie.domain]
+
+    def _get_host_policy(self, host: str) -> tuple[AdaptiveLimiter, TokenBucket]:
+        policies = _host_policies.setdefault(asyncio.get_running_loop(), {})
+        if host not in policies:
+            policies[host] = (AdaptiveLimiter(self._host_limits.get(host, self._max_connections_per_host),
+                                              max_limit=self._max_connections),
+                              TokenBucket(self._rate_limit))
+        return policies[host]
+
+    @staticmethod
+    def _is_retryable(method: str, response: httpx.Response = None, error: httpx.TransportError = None) -> bool:
+        if error is not None:
+            # a request that could not connect never reached the server
+            return method in IDEMPOTENT_METHODS or isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout,
+                                                                      httpx.PoolTimeout))
+        if response.status_code in THROTTLE_STATUS_CODES:
+            return True
+        return method in IDEMPOTENT_METHODS and response.status_code in RETRY_STATUS_CODES
+
+    async def _backoff(self, host: str, attempt: int, response: httpx.Response = None):
+        limiter, bucket = self._get_host_policy(host)
+        retry_after = None
+        if response is not None and response.status_code in THROTTLE_STATUS_CODES:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            limiter.on_throttle()
+            if retry_after is not None:
+                bucket.defer(retry_after)
+        await asyncio.sleep(backoff_delay(attempt, retry_after))
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        host = httpx.URL(url).host
+        limiter, bucket = self._get_host_policy(host)
+        attempt = 0
+        while True:
+            attempt += 1
+            await bucket.acquire()
+            tracing.count("http_requests")
+            async with limiter:
+                try:
+                    response = await self._client.request(method, override_url(url), **kwargs)
+                except httpx.TransportError as e:
+                    if attempt > self._max_retries or not self._is_retryable(method, error=e):
+                        raise e
+                    response = None
+            if response is not None:
+                if attempt > self._max_retries or not self._is_retryable(method, response=response):
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        limiter.on_success()
+                    return response
+            await self._backoff(host, attempt, response)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """
+        send the request without reading the response body, that can be read in chunks.
+        only the request is retried, an error while reading the body is raised
+        """
+        host = httpx.URL(url).host
+        limiter, bucket = self._get_host_policy(host)
+        attempt = 0
+        while True:
+            attempt += 1
+            await bucket.acquire()
+            retry_response = None
+            yielded = False
+            tracing.count("http_requests")
+            async with limiter:
+                try:
+                    async with self._client.stream(method, override_url(url), **kwargs) as response:
+                        if attempt <= self._max_retries and self._is_retryable(method, response=response):
+                            retry_response = response
+                        else:
+                            if response.status_code not in RETRY_STATUS_CODES:
+                                limiter.on_success()
+                            yielded = True
+                            yield response
+                            return
+                except httpx.TransportError as e:
+                    if yielded or attempt > self._max_retries or not self._is_retryable(method, error=e):
+                        raise e
+            await self._backoff(host, attempt, retry_response)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def close(self):
+        await self._client.aclose()
@@ -0,0 +1,142 @@
+import json
+import os
+import sqlite3
+import uuid
+from datetime import datetime
+from typing import Any
+
+from bolletta_sync.providers.base_provider import Invoice
+
+# the stages of the invoices are written in a single transaction every JOURNAL_FLUSH_SIZE records, a run interrupted
+# before the flush only redoes the stages of those invoices
+JOURNAL_FLUSH_SIZE = int(os.getenv("JOURNAL_FLUSH_SIZE", "100"))
+
+
+class Journal:
+    """
+    sqlite journal of the sync runs: the parameters of the run, the outcome of every provider and the last
+    stage completed by every invoice, so a failed or interrupted run can be resumed.
+    the listeners, e.g. the progress of the ui, get every record_provider and record_stage call too
+    """
+
+    def __init__(self, path: str, listeners: list[Any] = None):
+        self.run_id: str = None
+        self.listeners = listeners or []
+        self._pending_stages: list[tuple] = []
+        self._connection = sqlite3.connect(path)
+        self._connection.row_factory = sqlite3.Row
+        # the commits are not synced to disk one by one, only the checkpoints of the write-ahead log
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT NOT NULL PRIMARY KEY,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                started_at TEXT NOT NULL,
+                finished_at TEXT
+            )
+        """)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS run_providers (
+                run_id TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (run_id, provider)
+            )
+        """)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS run_invoices (
+                run_id TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                client_code TEXT NOT NULL,
+                invoice_id TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                error TEXT,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (run_id, provider, client_code, invoice_id)
+            )
+        """)
+        self._connection.commit()
+
+    def start(self, params: dict) -> str:
+        """
+        record a new run with its parameters and return its id
+        """
+        self.run_id = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self._connection.execute(
+            "INSERT INTO runs (run_id, params, status, started_at) VALUES (?, ?, ?, ?)",
+            (self.run_id, json.dumps(params), "running", datetime.now().isoformat())
+        )
+        self._connection.commit()
+        return self.run_id
+
+    def resume(self, run_id: str) -> dict:
+        """
+        reopen a previous run and return its parameters
+        """
+        row = self._connection.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise Exception(f"Unknown run {run_id}")
+        self.run_id = run_id
+        self._connection.execute("UPDATE runs SET status = ?, finished_at = NULL WHERE run_id = ?",
+                                 ("running", run_id))
+        self._connection.commit()
+        return json.loads(row["params"])
+
+    def finish(self, status: str):
+        self.flush()
+        self._connection.execute("UPDATE runs SET status = ?, finished_at = ? WHERE run_id = ?",
+                                 (status, datetime.now().isoformat(), self.run_id))
+        self._connection.commit()
+
+    def record_provider(self, provider: str, status: str, error: str = None):
+        self.flush()
+        self._connection.execute(
+            "INSERT OR REPLACE INTO run_providers (run_id, provider, status, error, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (self.run_id, provider, status, error, datetime.now().isoformat())
+        )
+        self._connection.commit()
+        for listener in self.listeners:
+            listener.record_provider(provider, status, error)
+
+    def get_completed_providers(self) -> set[str]:
+        rows = self._connection.execute(
+            "SELECT provider FROM run_providers WHERE run_id = ? AND status = 'completed'", (self.run_id,)
+        ).fetchall()
+        return {row["provider"] for row in rows}
+
+    def record_stage(self, provider: str, invoice: Invoice, stage: str, error: str = None):
+        """
+        record the last stage completed by the invoice, or the stage that failed with its error
+        """
+        self._pending_stages.append(
+            (self.run_id, provider, invoice.client_code, invoice.id, stage, error, datetime.now().isoformat()))
+        if len(self._pending_stages) >= JOURNAL_FLUSH_SIZE:
+            self.flush()
+        for listener in self.listeners:
+            listener.record_stage(provider, invoice, stage, error)
+
+    def flush(self):
+        """
+        write the pending stages of the invoices in a single transaction
+        """
+        if not self._pending_stages:
+            return
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO run_invoices (run_id, provider, client_code, invoice_id, stage, error, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", self._pending_stages)
+        self._connection.commit()
+        self._pending_stages = []
+
+    def get_failures(self) -> list[sqlite3.Row]:
+        self.flush()
+        return self._connection.execute(
+            "SELECT * FROM run_invoices WHERE run_id = ? AND error IS NOT NULL", (self.run_id,)
+        ).fetchall()
+
+    def close(self):
+        self.flush()
+        self._connection.close()
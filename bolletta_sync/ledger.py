@@ -0,0 +1,175 @@
+import sqlite3
+from datetime import date, datetime, timedelta
+
+from bolletta_sync.providers.base_provider import Invoice
+
+
+class Ledger:
+    """
+    local sqlite ledger of the invoices already synced, keyed by provider, client code and invoice id
+    """
+
+    def __init__(self, path: str):
+        self._connection = sqlite3.connect(path)
+        self._connection.row_factory = sqlite3.Row
+        # every stage of every invoice writes the ledger, in wal mode a commit does not wait for the disk
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS invoices (
+                provider TEXT NOT NULL,
+                client_code TEXT NOT NULL,
+                invoice_id TEXT NOT NULL,
+                sha256 TEXT,
+                md5 TEXT,
+                amount REAL,
+                task_id TEXT,
+                downloaded_at TEXT,
+                tasked_at TEXT,
+                PRIMARY KEY (provider, client_code, invoice_id)
+            )
+        """)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS watermarks (
+                provider TEXT NOT NULL,
+                client_code TEXT NOT NULL,
+                synced_until TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (provider, client_code)
+            )
+        """)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS backfills (
+                provider TEXT NOT NULL,
+                account TEXT NOT NULL,
+                start_date TEXT NOT NULL,
+                end_date TEXT NOT NULL,
+                completed_at TEXT NOT NULL,
+                PRIMARY KEY (provider, account, start_date, end_date)
+            )
+        """)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                provider TEXT NOT NULL,
+                client_code TEXT NOT NULL,
+                invoice_id TEXT NOT NULL,
+                sink TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                uploaded_at TEXT NOT NULL,
+                PRIMARY KEY (provider, client_code, invoice_id, sink)
+            )
+        """)
+        self._connection.commit()
+
+    def _upsert(self, provider: str, invoice: Invoice, **values):
+        columns = ", ".join(values)
+        placeholders = ", ".join("?" for _ in values)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in values)
+        self._connection.execute(
+            f"INSERT INTO invoices (provider, client_code, invoice_id, {columns}) VALUES (?, ?, ?, {placeholders}) "
+            f"ON CONFLICT (provider, client_code, invoice_id) DO UPDATE SET {updates}",
+            (provider, invoice.client_code, invoice.id, *values.values())
+        )
+        self._connection.commit()
+
+    def get(self, provider: str, invoice: Invoice) -> sqlite3.Row | None:
+        return self._connection.execute(
+            "SELECT * FROM invoices WHERE provider = ? AND client_code = ? AND invoice_id = ?",
+            (provider, invoice.client_code, invoice.id)
+        ).fetchone()
+
+    def get_files(self, provider: str, invoice: Invoice) -> dict[str, str]:
+        """
+        return the id of the file of the invoice in every sink it was saved to
+        """
+        return {row["sink"]: row["file_id"] for row in self._connection.execute(
+            "SELECT sink, file_id FROM files WHERE provider = ? AND client_code = ? AND invoice_id = ?",
+            (provider, invoice.client_code, invoice.id)
+        )}
+
+    def get_uploaded(self, provider: str, sink: str) -> list[sqlite3.Row]:
+        return self._connection.execute(
+            "SELECT * FROM files WHERE provider = ? AND sink = ?", (provider, sink)
+        ).fetchall()
+
+    def is_synced(self, provider: str, invoice: Invoice, sinks: list[str]) -> bool:
+        """
+        whether the invoice is saved to all the sinks and reminded
+        """
+        row = self.get(provider, invoice)
+        if row is None or row["task_id"] is None:
+            return False
+        return set(sinks) <= set(self.get_files(provider, invoice))
+
+    def is_changed(self, provider: str, invoice: Invoice) -> bool:
+        """
+        whether the provider lists the invoice with a different amount than the one downloaded, i.e. it was reissued
+        """
+        row = self.get(provider, invoice)
+        return row is not None and row["amount"] is not None and row["amount"] != invoice.amount
+
+    def record_download(self, provider: str, invoice: Invoice, sha256: str, md5: str):
+        self._upsert(provider, invoice, sha256=sha256, md5=md5, amount=invoice.amount,
+                     downloaded_at=datetime.now().isoformat())
+
+    def record_upload(self, provider: str, invoice: Invoice, sink: str, file_id: str):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO files (provider, client_code, invoice_id, sink, file_id, uploaded_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (provider, invoice.client_code, invoice.id, sink, file_id, datetime.now().isoformat())
+        )
+        self._connection.commit()
+
+    def record_task(self, provider: str, invoice: Invoice, task_id: str):
+        self._upsert(provider, invoice, task_id=task_id, tasked_at=datetime.now().isoformat())
+
+    def clear_upload(self, provider: str, client_code: str, invoice_id: str, sink: str):
+        self._connection.execute(
+            "DELETE FROM files WHERE provider = ? AND client_code = ? AND invoice_id = ? AND sink = ?",
+            (provider, client_code, invoice_id, sink)
+        )
+        self._connection.commit()
+
+    def get_watermark(self, provider: str) -> date | None:
+        """
+        return the date until which all the client codes of the provider are synced
+        """
+        row = self._connection.execute(
+            "SELECT MIN(synced_until) AS synced_until FROM watermarks WHERE provider = ?", (provider,)
+        ).fetchone()
+        return date.fromisoformat(row["synced_until"]) if row["synced_until"] else None
+
+    def set_watermark(self, provider: str, client_code: str, synced_from: date, synced_until: date):
+        """
+        move the watermark to synced_until when the synced range starts at or before the day after it,
+        a range after a gap leaves the gap to the next runs
+        """
+        self._connection.execute(
+            "INSERT INTO watermarks (provider, client_code, synced_until, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (provider, client_code) DO UPDATE SET "
+            "synced_until = MAX(synced_until, excluded.synced_until), updated_at = excluded.updated_at "
+            "WHERE synced_until >= ?",
+            (provider, client_code, synced_until.isoformat(), datetime.now().isoformat(),
+             (synced_from - timedelta(days=1)).isoformat())
+        )
+        self._connection.commit()
+
+    def is_backfilled(self, provider: str, account: str, start_date: date, end_date: date) -> bool:
+        return self._connection.execute(
+            "SELECT 1 FROM backfills WHERE provider = ? AND account = ? AND start_date = ? AND end_date = ?",
+            (provider, account, start_date.isoformat(), end_date.isoformat())
+        ).fetchone() is not None
+
+    def record_backfill(self, provider: str, account: str, start_date: date, end_date: date):
+        """
+        checkpoint a completed chunk of a backfill
+        """
+        self._connection.execute(
+            "INSERT OR REPLACE INTO backfills (provider, account, start_date, end_date, completed_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (provider, account, start_date.isoformat(), end_date.isoformat(), datetime.now().isoformat())
+        )
+        self._connection.commit()
+
+    def close(self):
+        self._connection.close()
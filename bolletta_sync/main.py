@@ -1,15 +1,16 @@
+from __future__ import annotations
+
 import asyncio
 import logging
 import os
 import sys
+import time
+from dataclasses import dataclass, replace
 from datetime import date, timedelta
 from enum import Enum
+from typing import TYPE_CHECKING
 
 from dotenv import load_dotenv
-from google.auth.transport.requests import Request as AuthRequest
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from playwright.async_api import async_playwright, Browser
 from pydantic import BaseModel, model_validator
 
 DEV_MODE = os.getenv("DEV_MODE") == "true"
@@ -29,70 +30,356 @@ os.environ['PLAYWRIGHT_BROWSERS_PATH'] = pw_browsers
 logger = logging.getLogger()
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] - %(message)s")
 
-from bolletta_sync.providers.eni import Eni
-from bolletta_sync.providers.fastweb import Fastweb
-from bolletta_sync.providers.fastweb_energia import FastwebEnergia
-from bolletta_sync.providers.umbra_acque import UmbraAcque
+from bolletta_sync import tracing
+from bolletta_sync.pipeline import Pipeline, Stage
+from bolletta_sync.providers.registry import get_provider_names, load_provider
+
+# the google clients, playwright and the provider modules are imported only when a sync starts
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
+    from bolletta_sync.browser import BrowserRecording, LazyBrowser
+    from bolletta_sync.google_gateway import GoogleGateway
+    from bolletta_sync.journal import Journal
+    from bolletta_sync.ledger import Ledger
+    from bolletta_sync.namespace import NamespaceResolver
+    from bolletta_sync.progress import SyncProgress
+    from bolletta_sync.providers.base_provider import BaseProvider, Invoice, InvoicePdf
+    from bolletta_sync.session_cache import SessionCache
+    from bolletta_sync.sinks.base_sink import BaseSink
 
 google_auth_scopes = ["https://www.googleapis.com/auth/drive", "https://www.googleapis.com/auth/tasks"]
 google_credentials_file = os.path.join(base_path, "google_credentials.json")
 google_token_file = os.path.join(base_path, "google_token.json")
-
-
-class Provider(Enum):
-    FASTWEB = "fastweb"
-    FASTEWEB_ENERGIA = "fastweb_energia"
-    ENI = "eni"
-    UMBRA_ACQUE = "umbra_acque"
+ledger_file = os.path.join(base_path, "bolletta_sync.db")
+session_cache_path = os.path.join(base_path, "sessions")
+session_key_file = os.path.join(base_path, "session.key")
+namespace_cache_file = os.path.join(base_path, "namespace_cache.json")
+reports_path = os.path.join(base_path, "reports")
+reports_keep = int(os.getenv("REPORTS_KEEP", "50"))
+metrics_path = os.getenv("METRICS_PATH")
+otlp_endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+browser_profiling = os.getenv("BROWSER_PROFILING") == "true"
+browser_profiling_path = os.path.join(base_path, "profiles")
+browser_profiling_login_threshold = float(os.getenv("BROWSER_PROFILING_LOGIN_THRESHOLD", "30"))
+browser_profiling_sync_threshold = float(os.getenv("BROWSER_PROFILING_SYNC_THRESHOLD", "300"))
+browser_profiling_keep = int(os.getenv("BROWSER_PROFILING_KEEP", "10"))
+sync_overlap_days = int(os.getenv("SYNC_OVERLAP_DAYS", "3"))
+sync_max_accounts = int(os.getenv("SYNC_MAX_ACCOUNTS", "4"))
+pipeline_queue_size = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+pipeline_download_concurrency = int(os.getenv("PIPELINE_DOWNLOAD_CONCURRENCY", "4"))
+pipeline_upload_concurrency = int(os.getenv("PIPELINE_UPLOAD_CONCURRENCY", "4"))
+pipeline_task_batch_size = int(os.getenv("PIPELINE_TASK_BATCH_SIZE", "20"))
+storage_sinks = [name.strip() for name in os.getenv("STORAGE_SINKS", "drive").split(",") if name.strip()]
+
+
+Provider = Enum("Provider", {name.upper(): name for name in get_provider_names()})
 
 
 class SyncParams(BaseModel):
     provider: Provider
     start_date: date
     end_date: date
+    backfill: bool = False
 
     @model_validator(mode="after")
-    def validate_year(self):
-        if self.start_date.year != self.end_date.year:
-            raise ValueError("start_date and end_date must be in the same year")
+    def validate_range(self):
+        if self.start_date > self.end_date:
+            raise ValueError("start_date must not be after end_date")
         return self
 
 
-async def sync(params: SyncParams, google_credentials: Credentials, brower: Browser):
+def get_sync_params(provider: Provider, start_date: date, end_date: date) -> list[SyncParams]:
+    """
+    split the range in one sync params per year, the chunks of a backfill
+    """
+    sync_params = []
+    while start_date.year < end_date.year:
+        sync_params.append(SyncParams(provider=provider, start_date=start_date, end_date=date(start_date.year, 12, 31)))
+        start_date = date(start_date.year + 1, 1, 1)
+    sync_params.append(SyncParams(provider=provider, start_date=start_date, end_date=end_date))
+    return sync_params
+
+
+def get_start_date(provider: Provider, ledger: Ledger) -> date:
+    """
+    return the start date of an incremental sync: the last synced date minus the overlap days,
+    or the last 10 days when the provider was never synced
+    """
+    watermark = ledger.get_watermark(provider.value)
+    if watermark is None:
+        return date.today() - timedelta(days=10)
+    return watermark - timedelta(days=sync_overlap_days)
+
+
+@dataclass
+class SyncContext:
+    google_gateway: GoogleGateway
+    namespace_resolver: NamespaceResolver
+    ledger: Ledger
+    journal: Journal
+    session_cache: SessionCache
+    browser: LazyBrowser
+    accounts_semaphore: asyncio.Semaphore
+    sinks: list[BaseSink]
+
+
+async def sync(params: SyncParams, context: SyncContext):
     logger.info(f"{params.provider.value} - Syncing invoices from {params.start_date} to {params.end_date}")
 
-    page = await brower.new_page(locale="en-EN")
-    instance = None
+    provider_class = load_provider(params.provider.value)
 
-    if params.provider == Provider.FASTWEB:
-        instance = Fastweb(google_credentials, page)
-    elif params.provider == Provider.FASTEWEB_ENERGIA:
-        instance = FastwebEnergia(google_credentials, page)
-    elif params.provider == Provider.ENI:
-        instance = Eni(google_credentials, page)
-    elif params.provider == Provider.UMBRA_ACQUE:
-        instance = UmbraAcque(google_credentials, page)
+    # every account runs to the end even when another one fails
+    results = await asyncio.gather(
+        *(sync_account(params, provider_class, account, context) for account in provider_class.get_accounts()),
+        return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
 
-    if instance is None:
-        raise Exception("Unknown provider")
+    logger.info(f"{params.provider.value} - Invoices synced successfully")
 
+
+async def sync_account(params: SyncParams, provider_class: type[BaseProvider], account: str | None,
+                       context: SyncContext):
+    """
+    sync a single account of the provider in its own browser context and http session
+    """
+    async with context.accounts_semaphore:
+        provider = params.provider.value
+        ledger = context.ledger
+        sink_names = [sink.name for sink in context.sinks]
+        chunks = get_sync_params(params.provider, params.start_date, params.end_date)
+        if params.backfill:
+            chunks = [chunk for chunk in chunks
+                      if not ledger.is_backfilled(provider, account or "", chunk.start_date, chunk.end_date)]
+            if not chunks:
+                logger.info(f"{provider} - Range already backfilled" + (f" for {account}" if account else ""))
+                return
+
+        session_account = ":".join(filter(None, [provider, os.getenv(provider_class.username_env), account]))
+        storage_state = context.session_cache.load(session_account)
+
+        recording: BrowserRecording | None = None
+
+        async def new_page():
+            nonlocal recording
+            options = {}
+            if browser_profiling:
+                from bolletta_sync.browser import BrowserRecording
+
+                recording = BrowserRecording(browser_profiling_path, "_".join(filter(None, [provider, account])),
+                                             browser_profiling_keep)
+                options = recording.context_options()
+            browser_context = await context.browser.new_context(locale="en-EN", storage_state=storage_state,
+                                                                **options)
+            if recording is not None:
+                await recording.start(browser_context)
+            return await browser_context.new_page()
+
+        instance = provider_class(context.google_gateway, context.namespace_resolver, new_page, account)
+        if storage_state:
+            instance.restore_storage_state(storage_state)
+
+        started_at = time.perf_counter()
+        error = None
+        try:
+            logger.info(f"{provider} - Syncing invoices" + (f" for {account}" if account else ""))
+            with tracing.span("list", provider=provider, client_code=account or "") as span:
+                invoces = await instance.get_invoices(chunks[0].start_date, chunks[-1].end_date)
+                span.set(invoices=len(invoces))
+            logger.info(f"{provider} - Synced {len(invoces)} invoices")
+            context.session_cache.save(session_account, await instance.get_storage_state())
+
+            pending_invoices = [invoce for invoce in invoces if not ledger.is_synced(provider, invoce, sink_names)
+                                or ledger.is_changed(provider, invoce)]
+            if len(pending_invoices) < len(invoces):
+                logger.info(f"{provider} - {len(invoces) - len(pending_invoices)} invoices already synced")
+            for invoce in pending_invoices:
+                context.journal.record_stage(provider, invoce, "listed")
+
+            async def sync_chunk(chunk: SyncParams):
+                chunk_invoices = [invoce for invoce in pending_invoices
+                                  if chunk.start_date <= invoce.doc_date <= chunk.end_date]
+                if chunk_invoices:
+                    await save_invoices(provider, instance, chunk_invoices, ledger, context.journal, context.sinks)
+                if params.backfill:
+                    ledger.record_backfill(provider, account or "", chunk.start_date, chunk.end_date)
+                    logger.info(f"{provider} - Backfilled {chunk.start_date.year}")
+
+            # the invoices are listed once for the whole range, then every year goes to its own folder concurrently.
+            # every chunk runs to the end before the provider is closed, even when another one fails
+            results = await asyncio.gather(*(sync_chunk(chunk) for chunk in chunks), return_exceptions=True)
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+
+            for client_code in instance.client_codes or [""]:
+                ledger.set_watermark(provider, client_code, params.start_date, params.end_date)
+        except Exception as e:
+            logger.error(f"{provider} - Error while syncing cause: {e}")
+            if storage_state and not instance.logged_in:
+                # the cached session was rejected and no login replaced it, the next run starts from a clean one
+                context.session_cache.delete(session_account)
+            error = e
+            raise e
+        finally:
+            await close_provider(provider, instance, recording, error, time.perf_counter() - started_at)
+
+
+async def close_provider(provider: str, instance: BaseProvider, recording: BrowserRecording | None,
+                         error: Exception | None, sync_duration: float):
+    """
+    close the provider, the browser recording of its session is kept when the sync failed, or when the login
+    or the whole sync were slower than their threshold
+    """
+    if recording is None:
+        await instance.close()
+        return
+
+    reasons = []
+    if error is not None:
+        reasons.append("error")
+    if (instance.login_duration or 0) > browser_profiling_login_threshold:
+        reasons.append("slow login")
+    if sync_duration > browser_profiling_sync_threshold:
+        reasons.append("slow sync")
     try:
-        logger.info(f"{params.provider.value} - Syncing invoices")
-        invoces = await instance.get_invoices(params.start_date, params.end_date)
-        logger.info(f"{params.provider.value} - Synced {len(invoces)} invoices")
-        await instance.check_namespace()
-        for invoce in invoces:
-            doc = await instance.download_invoice(invoce)
-            await instance.save_invoice(invoce, doc)
-            await instance.set_expire_invoice(invoce)
+        await recording.stop(keep=bool(reasons))
     except Exception as e:
-        logger.error(f"{params.provider.value} - Error while syncing cause: {e}")
-        raise e
-
-    logger.info(f"{params.provider.value} - Invoices synced successfully")
+        logger.warning(f"Browser recording failed cause: {e}")
+    try:
+        await instance.close()
+    finally:
+        recording.finish(keep=bool(reasons), info={
+            "provider": provider, "account": instance.account, "reasons": reasons,
+            "login_duration": instance.login_duration, "sync_duration": sync_duration,
+            "error": str(error) if error is not None else None,
+        })
+
+
+async def save_invoices(provider: str, instance: BaseProvider, invoices: list[Invoice], ledger: Ledger,
+                        journal: Journal, sinks: list[BaseSink]):
+    """
+    download, upload and remind the invoices in a pipeline, so the download of an invoice overlaps the upload of
+    the previous one. every pdf is downloaded once and saved to the sinks that miss it in parallel. the stage
+    completed by every invoice, or the stage that failed, is recorded in the journal. a failed invoice is dropped
+    from the pipeline, the others go on and the provider fails once the pipeline is drained
+    """
+    await instance.check_namespace(invoices, sinks)
+    failures: list[Exception] = []
+
+    async def download(invoce: Invoice) -> tuple[Invoice, InvoicePdf | None, list[BaseSink]] | None:
+        files = ledger.get_files(provider, invoce)
+        missing_sinks = [sink for sink in sinks if sink.name not in files]
+        if not missing_sinks and not ledger.is_changed(provider, invoce):
+            return invoce, None, []
+        row = ledger.get(provider, invoce)
+        try:
+            with tracing.span("download", provider=provider, client_code=invoce.client_code,
+                              invoice=invoce.id) as span:
+                doc = await instance.download_invoice(invoce)
+                span.count("bytes", doc.size)
+        except Exception as e:
+            journal.record_stage(provider, invoce, "download", str(e))
+            failures.append(e)
+            return None
+        ledger.record_download(provider, invoce, doc.sha256, doc.md5)
+        journal.record_stage(provider, invoce, "downloaded")
+        if not files or row["sha256"] != doc.sha256:
+            return invoce, doc, sinks
+        if not missing_sinks:
+            logger.info(f"{provider} - Invoice {invoce.id} unchanged since the last upload")
+            doc.close()
+            return invoce, None, []
+        return invoce, doc, missing_sinks
+
+    async def upload(item: tuple[Invoice, InvoicePdf | None, list[BaseSink]]) -> Invoice | None:
+        invoce, doc, target_sinks = item
+        if doc is not None:
+            try:
+                with tracing.span("upload", provider=provider, client_code=invoce.client_code,
+                                  invoice=invoce.id) as span:
+                    results = await instance.save_invoice(invoce, doc, target_sinks)
+                    span.count("bytes", doc.size)
+                    # the sinks that saved the invoice are not retried by the next run
+                    errors = []
+                    for sink_name, result in results.items():
+                        if isinstance(result, BaseException):
+                            errors.append(result)
+                        else:
+                            ledger.record_upload(provider, invoce, sink_name, result)
+                    if errors:
+                        raise errors[0]
+            except Exception as e:
+                journal.record_stage(provider, invoce, "upload", str(e))
+                failures.append(e)
+                return None
+            finally:
+                doc.close()
+            journal.record_stage(provider, invoce, "uploaded")
+        return invoce
+
+    async def remind(batch: list[Invoice]):
+        try:
+            with tracing.span("task", provider=provider) as span:
+                await instance.set_expire_invoices(batch)
+                span.set(invoices=len(batch))
+        except Exception as e:
+            for invoce in batch:
+                journal.record_stage(provider, invoce, "task", str(e))
+            failures.append(e)
+            return
+        for invoce in batch:
+            try:
+                ledger.record_task(provider, invoce, (await instance.get_task(invoce))["id"])
+            except Exception as e:
+                journal.record_stage(provider, invoce, "task", str(e))
+                failures.append(e)
+                continue
+            journal.record_stage(provider, invoce, "tasked")
+
+    # the sinks bound their writes across all the providers
+    pipeline = Pipeline([
+        Stage("download", download, concurrency=pipeline_download_concurrency),
+        Stage("upload", upload, concurrency=pipeline_upload_concurrency),
+        Stage("task", remind, batch_size=pipeline_task_batch_size),
+    ], queue_size=pipeline_queue_size)
+    await pipeline.run(invoices)
+
+    for stage in pipeline.stages:
+        logger.info(f"{provider} - {stage}")
+    if failures:
+        raise Exception(f"{len(failures)} invoices failed, first cause: {failures[0]}")
+
+
+async def verify(provider: Provider, sinks: list[BaseSink], ledger: Ledger):
+    """
+    reconcile the ledger with the sinks, the invoices whose file is missing from a sink will be saved to it again
+    """
+    async def verify_sink(sink: BaseSink):
+        rows = ledger.get_uploaded(provider.value, sink.name)
+        if not rows:
+            return
+
+        missing = set()
+        with tracing.span("verify", provider=provider.value, sink=sink.name, invoices=len(rows)):
+            for start in range(0, len(rows), sink.batch_size):
+                missing |= await sink.get_missing([row["file_id"] for row in rows[start:start + sink.batch_size]])
+
+        missing_rows = [row for row in rows if row["file_id"] in missing]
+        for row in missing_rows:
+            ledger.clear_upload(provider.value, row["client_code"], row["invoice_id"], sink.name)
+
+        logger.info(f"{provider.value} - Verified {len(rows)} invoices, {len(missing_rows)} missing in {sink.name}")
+
+    await asyncio.gather(*(verify_sink(sink) for sink in sinks))
 
 
 async def get_google_credentials() -> Credentials:
+    from google.auth.transport.requests import Request as AuthRequest
+    from google.oauth2.credentials import Credentials
+
     google_credentials = None
 
     if os.path.exists(google_token_file):
@@ -109,6 +396,8 @@ async def get_google_credentials() -> Credentials:
 
 
 async def google_auth():
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
     flow = InstalledAppFlow.from_client_secrets_file(google_credentials_file, google_auth_scopes)
     credentials = flow.run_local_server(port=0)
 
@@ -116,17 +405,163 @@ async def google_auth():
         token.write(credentials.to_json())
 
 
-async def main(providers: list[Provider] = None, start_date: date = None, end_date: date = None):
-    google_credentials = await get_google_credentials()
+async def sync_provider(params: SyncParams, context: SyncContext) -> bool:
+    """
+    sync the provider recording its outcome in the journal, a failure does not cancel the other providers
+    """
+    provider = params.provider.value
+    context.journal.record_provider(provider, "running")
+    try:
+        with tracing.span("provider", provider=provider):
+            await sync(params, context)
+    except Exception as e:
+        logger.error(f"{provider} - Sync failed cause: {e}")
+        context.journal.record_provider(provider, "failed", str(e))
+        return False
+    context.journal.record_provider(provider, "completed")
+    return True
+
+
+def create_sync_context(google_credentials: Credentials) -> SyncContext:
+    """
+    create the services shared by the syncs, the journal is created by every run
+    """
+    from bolletta_sync.browser import LazyBrowser
+    from bolletta_sync.google_gateway import GoogleGateway
+    from bolletta_sync.ledger import Ledger
+    from bolletta_sync.namespace import NamespaceResolver
+    from bolletta_sync.session_cache import SessionCache
+    from bolletta_sync.sinks.registry import load_sink
+
+    google_gateway = GoogleGateway(google_credentials)
+    namespace_resolver = NamespaceResolver(google_gateway, namespace_cache_file)
+    if not storage_sinks:
+        raise Exception("STORAGE_SINKS must name at least one sink")
+    context = SyncContext(google_gateway=google_gateway, namespace_resolver=namespace_resolver,
+                          ledger=Ledger(ledger_file), journal=None,
+                          session_cache=SessionCache(session_cache_path, SessionCache.load_key(session_key_file)),
+                          browser=LazyBrowser(headless=DEV_MODE == False),
+                          accounts_semaphore=asyncio.Semaphore(sync_max_accounts), sinks=[])
+    context.sinks = [load_sink(name).from_context(context) for name in storage_sinks]
+    return context
+
+
+async def close_sync_context(context: SyncContext):
+    try:
+        await context.browser.close()
+    finally:
+        for sink in context.sinks:
+            await sink.close()
+        context.google_gateway.close()
+        context.ledger.close()
+
+
+async def run_sync(context: SyncContext, providers: list[Provider] = None, start_date: date = None,
+                   end_date: date = None, verify_ledger: bool = False, backfill: bool = False,
+                   resume_run_id: str = None, progress: SyncProgress = None) -> str:
+    """
+    sync the providers from start_date, or from their last sync, to end_date. the range can span several years,
+    with backfill the completed years are checkpointed and skipped when an interrupted backfill is run again.
+    every run is recorded in the journal, resume_run_id runs again the providers that did not complete that run.
+    the progress, when given, follows the journal records
+    """
+    from bolletta_sync.journal import Journal
+
+    if backfill and start_date is None:
+        raise Exception("backfill requires a start date")
+
+    journal = Journal(ledger_file, listeners=[progress] if progress is not None else None)
+    context = replace(context, journal=journal)
+    ledger = context.ledger
 
-    start_date = start_date if start_date else date.today() - timedelta(days=10)
     end_date = end_date if end_date else date.today()
     providers = providers if providers else list(Provider)
 
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=DEV_MODE == False)
-        tasks = []
-        for provider in providers:
-            params = SyncParams(provider=provider, start_date=start_date, end_date=end_date)
-            tasks.append(sync(params, google_credentials, browser))
-        await asyncio.gather(*tasks)
+    tracer = tracing.Tracer()
+    outcomes: dict[str, bool] = {}
+    try:
+        with tracer.span("run") as span:
+            # the context of a long-running service outlives the run, its indexes and sinks may be stale
+            await context.namespace_resolver.refresh()
+            await asyncio.gather(*(sink.refresh() for sink in context.sinks))
+            if resume_run_id:
+                run_params = journal.resume(resume_run_id)
+                completed_providers = journal.get_completed_providers()
+                sync_params = [SyncParams.model_validate(params) for params in run_params["sync_params"]
+                               if params["provider"] not in completed_providers]
+                logger.info(f"Resuming run {resume_run_id}, {len(completed_providers)} providers already completed")
+            else:
+                sync_params = []
+                for provider in providers:
+                    provider_start_date = start_date if start_date else min(get_start_date(provider, ledger),
+                                                                            end_date)
+                    sync_params.append(SyncParams(provider=provider, start_date=provider_start_date,
+                                                  end_date=end_date, backfill=backfill))
+                journal.start({"sync_params": [params.model_dump(mode="json") for params in sync_params]})
+                logger.info(f"Starting run {journal.run_id}")
+            span.set(run_id=journal.run_id)
+
+            if verify_ledger:
+                await asyncio.gather(*(verify(params.provider, context.sinks, ledger) for params in sync_params))
+
+            results = await asyncio.gather(*(sync_provider(params, context) for params in sync_params))
+            outcomes = {params.provider.value: result for params, result in zip(sync_params, results)}
+
+        failed_providers = [provider for provider, result in outcomes.items() if not result]
+        for failure in journal.get_failures():
+            logger.error(f"{failure['provider']} - Invoice {failure['invoice_id']} failed at {failure['stage']} "
+                         f"cause: {failure['error']}")
+        journal.finish("failed" if failed_providers else "completed")
+        if failed_providers:
+            raise Exception(f"Sync failed for {', '.join(failed_providers)}, "
+                            f"run again with --resume {journal.run_id}")
+        return journal.run_id
+    finally:
+        journal.close()
+        if journal.run_id is not None:
+            await export_run(tracer, journal.run_id, outcomes)
+
+
+async def export_run(tracer: tracing.Tracer, run_id: str, outcomes: dict[str, bool]):
+    """
+    write the json report of the run, keeping the last reports_keep ones, then the prometheus textfile of every
+    provider and the otlp traces when configured. a failed export does not fail the run
+    """
+    try:
+        os.makedirs(reports_path, exist_ok=True)
+        report_file = os.path.join(reports_path, f"{run_id}.json")
+        tracer.write_report(report_file, run_id)
+        logger.info(f"Run report written to {report_file}")
+        # the run ids start with their timestamp
+        reports = sorted(name for name in os.listdir(reports_path) if name.endswith(".json"))
+        for name in reports[:-reports_keep] if reports_keep > 0 else []:
+            os.remove(os.path.join(reports_path, name))
+
+        if metrics_path:
+            os.makedirs(metrics_path, exist_ok=True)
+            for provider, success in outcomes.items():
+                tracer.write_prometheus(os.path.join(metrics_path, f"bolletta_sync_{provider}.prom"), provider,
+                                        success)
+
+        if otlp_endpoint:
+            import httpx
+
+            async with httpx.AsyncClient(timeout=30) as client:
+                response = await client.post(f"{otlp_endpoint.rstrip('/')}/v1/traces", json=tracer.to_otlp())
+                response.raise_for_status()
+    except Exception as e:
+        logger.warning(f"Run report export failed cause: {e}")
+
+
+async def main(providers: list[Provider] = None, start_date: date = None, end_date: date = None,
+               verify_ledger: bool = False, backfill: bool = False, resume_run_id: str = None,
+               progress: SyncProgress = None):
+    if backfill and start_date is None:
+        raise Exception("backfill requires a start date")
+
+    context = create_sync_context(await get_google_credentials())
+    try:
+        await run_sync(context, providers, start_date, end_date, verify_ledger=verify_ledger, backfill=backfill,
+                       resume_run_id=resume_run_id, progress=progress)
+    finally:
+        await close_sync_context(context)
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import os
+from collections.abc import Awaitable, Callable
+
+from googleapiclient.errors import HttpError
+
+from bolletta_sync.drive_index import DriveIndex
+from bolletta_sync.google_gateway import GoogleGateway
+from bolletta_sync.task_index import TASKS_PAGE_SIZE, TaskIndex
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+ROOT_FOLDER_NAME = "bollette"
+
+
+class NamespaceResolver:
+    """
+    resolve the google drive folders and the google tasks tasklists, shared by all the providers of the run.
+    the resolved ids are cached on disk and the concurrent resolutions of the same name run only once
+    """
+
+    def __init__(self, google_gateway: GoogleGateway, cache_file: str):
+        self._google_gateway = google_gateway
+        self._cache_file = cache_file
+        self._cache = {"folders": {}, "tasklists": {}}
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file) as f:
+                    self._cache.update(json.load(f))
+            except (OSError, ValueError):
+                pass
+        self._pending: dict[tuple, asyncio.Task] = {}
+        self._drive_indexes: dict[str, DriveIndex] = {}
+        self._task_indexes: dict[str, TaskIndex] = {}
+
+    def _save(self):
+        with open(self._cache_file + ".tmp", "w") as f:
+            json.dump(self._cache, f)
+        os.replace(self._cache_file + ".tmp", self._cache_file)
+
+    async def _single_flight(self, key: tuple, func: Callable[[], Awaitable]):
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def get_folder(self, folder_name: str, parent_folder_id: str = None) -> str:
+        """
+        return the id of the folder, creating it when missing
+        """
+        key = f"{parent_folder_id or 'root'}/{folder_name}"
+        folder_id = self._cache["folders"].get(key)
+        if folder_id:
+            return folder_id
+        return await self._single_flight(("folder", key), lambda: self._resolve_folder(key, folder_name,
+                                                                                        parent_folder_id))
+
+    async def _resolve_folder(self, key: str, folder_name: str, parent_folder_id: str = None) -> str:
+        drive_service = self._google_gateway.drive_service
+        query = f"name='{folder_name}' and mimeType='{FOLDER_MIME_TYPE}' and trashed=false"
+        if parent_folder_id:
+            query += f" and '{parent_folder_id}' in parents"
+        results = await self._google_gateway.execute(drive_service.files().list(q=query, spaces='drive'))
+
+        if results.get('files'):
+            folder_id = results.get('files')[0].get('id')
+        else:
+            folder_metadata = {'name': folder_name, 'mimeType': FOLDER_MIME_TYPE}
+            if parent_folder_id:
+                folder_metadata['parents'] = [parent_folder_id]
+            folder = await self._google_gateway.execute(drive_service.files().create(body=folder_metadata,
+                                                                                     fields='id'))
+            folder_id = folder.get('id')
+
+        self._cache["folders"][key] = folder_id
+        self._save()
+        return folder_id
+
+    async def get_namespace_folder(self, namespace: str, year: int) -> str:
+        """
+        return the id of the folder bollette/<year>/<namespace>
+        """
+        root_folder_id = await self.get_folder(ROOT_FOLDER_NAME)
+        year_folder_id = await self.get_folder(str(year), root_folder_id)
+        return await self.get_folder(namespace, year_folder_id)
+
+    def invalidate_folder(self, folder_id: str):
+        """
+        forget a folder that no longer exists, together with its subfolders
+        """
+        folders = self._cache["folders"]
+        stale_folder_ids = {folder_id}
+        stale_keys = True
+        while stale_keys:
+            stale_keys = [key for key, value in folders.items()
+                          if value in stale_folder_ids or key.split("/", 1)[0] in stale_folder_ids]
+            for key in stale_keys:
+                stale_folder_ids.add(folders.pop(key))
+
+        for stale_folder_id in stale_folder_ids:
+            self._drive_indexes.pop(stale_folder_id, None)
+        self._save()
+
+    async def get_tasklist(self, tasklist_name: str) -> str:
+        """
+        return the id of the tasklist, creating it when missing
+        """
+        tasklist_id = self._cache["tasklists"].get(tasklist_name)
+        if tasklist_id:
+            return tasklist_id
+        return await self._single_flight(("tasklist", tasklist_name), lambda: self._resolve_tasklist(tasklist_name))
+
+    async def _resolve_tasklist(self, tasklist_name: str) -> str:
+        tasks_service = self._google_gateway.tasks_service
+        tasklist_id = None
+        page_token = None
+        while tasklist_id is None:
+            tasklists = await self._google_gateway.execute(tasks_service.tasklists().list(
+                maxResults=TASKS_PAGE_SIZE, pageToken=page_token))
+            for tasklist in tasklists.get('items', []):
+                if tasklist['title'] == tasklist_name:
+                    tasklist_id = tasklist['id']
+                    break
+            page_token = tasklists.get('nextPageToken')
+            if not page_token:
+                break
+
+        if tasklist_id is None:
+            tasklist = await self._google_gateway.execute(
+                tasks_service.tasklists().insert(body={'title': tasklist_name}))
+            tasklist_id = tasklist['id']
+
+        self._cache["tasklists"][tasklist_name] = tasklist_id
+        self._save()
+        return tasklist_id
+
+    def invalidate_tasklist(self, tasklist_id: str):
+        tasklists = self._cache["tasklists"]
+        for key in [key for key, value in tasklists.items() if value == tasklist_id]:
+            tasklists.pop(key)
+        self._task_indexes.pop(tasklist_id, None)
+        self._save()
+
+    async def get_drive_index(self, folder_id: str) -> DriveIndex:
+        """
+        return the index of the folder, loaded once and shared by all the providers of the run
+        """
+        if folder_id in self._drive_indexes:
+            return self._drive_indexes[folder_id]
+
+        async def load() -> DriveIndex:
+            drive_index = DriveIndex(self._google_gateway, folder_id)
+            await drive_index.load()
+            self._drive_indexes[folder_id] = drive_index
+            return drive_index
+
+        return await self._single_flight(("drive_index", folder_id), load)
+
+    async def get_task_index(self, tasklist_id: str) -> TaskIndex:
+        """
+        return the index of the tasklist, loaded once and shared by all the providers of the run
+        """
+        if tasklist_id in self._task_indexes:
+            return self._task_indexes[tasklist_id]
+
+        async def load() -> TaskIndex:
+            task_index = TaskIndex(self._google_gateway, tasklist_id)
+            await task_index.load()
+            self._task_indexes[tasklist_id] = task_index
+            return task_index
+
+        return await self._single_flight(("task_index", tasklist_id), load)
+
+    async def _refresh_drive_index(self, drive_index: DriveIndex):
+        try:
+            await drive_index.load()
+        except HttpError as e:
+            if e.status_code != 404:
+                raise e
+            # the folder was deleted from google drive, it is resolved again when needed
+            self.invalidate_folder(drive_index.folder_id)
+
+    async def refresh(self):
+        """
+        bring the loaded indexes up to date with the changes made since the previous run: the folders are listed
+        again, the tasklists fetch only their tasks updated in the meantime
+        """
+
+        async def refresh_indexes():
+            await asyncio.gather(*(self._refresh_drive_index(drive_index)
+                                   for drive_index in list(self._drive_indexes.values())),
+                                 *(task_index.load() for task_index in list(self._task_indexes.values())))
+
+        await self._single_flight(("refresh",), refresh_indexes)
@@ -0,0 +1,109 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Any
+
+from bolletta_sync.tracing import percentile
+
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """
+    stage of a pipeline: func is called for every item, or for a list of up to batch_size items,
+    and returns the item (or the list of items) to pass to the next stage, None to drop it
+    """
+    name: str
+    func: Callable[[Any], Awaitable[Any]]
+    concurrency: int = 1
+    batch_size: int = 1
+    items: int = 0
+    busy_time: float = 0
+    started_at: float = None
+    finished_at: float = None
+    # duration of every call of func
+    latencies: list[float] = field(default_factory=list)
+
+    @property
+    def elapsed_time(self) -> float:
+        if self.started_at is None:
+            return 0
+        return self.finished_at - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.elapsed_time if self.elapsed_time else 0
+
+    def percentile(self, percent: float) -> float:
+        """
+        latency of the calls below which the given percent of them fall
+        """
+        return percentile(self.latencies, percent)
+
+    def __str__(self):
+        return (f"{self.name}: {self.items} items in {self.elapsed_time:.2f}s "
+                f"({self.throughput:.2f}/s, busy {self.busy_time:.2f}s)")
+
+
+class Pipeline:
+    """
+    run the items through the stages, the stages are connected by bounded queues so a slow stage
+    slows down the previous ones instead of buffering the items. the first error cancels the whole pipeline
+    """
+
+    def __init__(self, stages: list[Stage], queue_size: int):
+        self.stages = stages
+        self._queue_size = queue_size
+
+    async def run(self, items: Iterable):
+        queues = [asyncio.Queue(maxsize=self._queue_size) for _ in self.stages]
+        running_workers = [stage.concurrency for stage in self.stages]
+
+        async def feed():
+            for item in items:
+                await queues[0].put(item)
+            for _ in range(self.stages[0].concurrency):
+                await queues[0].put(_DONE)
+
+        async def work(index: int):
+            stage = self.stages[index]
+            next_queue = queues[index + 1] if index + 1 < len(self.stages) else None
+
+            while True:
+                batch = [await queues[index].get()]
+                while len(batch) < stage.batch_size and batch[-1] is not _DONE and not queues[index].empty():
+                    batch.append(queues[index].get_nowait())
+
+                batch_items = [item for item in batch if item is not _DONE]
+                if batch_items:
+                    started_at = perf_counter()
+                    if stage.started_at is None:
+                        stage.started_at = started_at
+                    result = await stage.func(batch_items if stage.batch_size > 1 else batch_items[0])
+                    stage.finished_at = perf_counter()
+                    stage.busy_time += stage.finished_at - started_at
+                    stage.latencies.append(stage.finished_at - started_at)
+                    stage.items += len(batch_items)
+
+                    results = (result or []) if stage.batch_size > 1 else [result] if result is not None else []
+                    if next_queue is not None:
+                        for next_item in results:
+                            await next_queue.put(next_item)
+
+                if batch[-1] is _DONE:
+                    running_workers[index] -= 1
+                    if running_workers[index] == 0 and next_queue is not None:
+                        for _ in range(self.stages[index + 1].concurrency):
+                            await next_queue.put(_DONE)
+                    return
+
+        try:
+            async with asyncio.TaskGroup() as task_group:
+                task_group.create_task(feed())
+                for index, stage in enumerate(self.stages):
+                    for _ in range(stage.concurrency):
+                        task_group.create_task(work(index))
+        except ExceptionGroup as e:
+            raise e.exceptions[0]
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING
+
+# the ui imports the progress before any sync, without the provider dependencies
+if TYPE_CHECKING:
+    from bolletta_sync.providers.base_provider import Invoice
+
+# the stages recorded in the journal by the invoices that completed them, counted by ProviderProgress
+COMPLETED_STAGES = ("listed", "downloaded", "uploaded", "tasked")
+
+
+@dataclass
+class ProviderProgress:
+    provider: str
+    status: str = "waiting"
+    listed: int = 0
+    downloaded: int = 0
+    uploaded: int = 0
+    tasked: int = 0
+    failed: int = 0
+    started_at: float = None
+    finished_at: float = None
+
+    @property
+    def elapsed_time(self) -> float:
+        if self.started_at is None:
+            return 0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """
+        invoices completed per second
+        """
+        return self.tasked / self.elapsed_time if self.elapsed_time else 0
+
+    @property
+    def fraction(self) -> float:
+        if self.status == "completed":
+            return 1
+        return self.tasked / self.listed if self.listed else 0
+
+    def __str__(self):
+        return (f"{self.status}: {self.listed} listed, {self.downloaded} downloaded, {self.uploaded} uploaded, "
+                f"{self.tasked} tasked" + (f", {self.failed} failed" if self.failed else "") +
+                f" ({self.throughput:.1f}/s)")
+
+
+class SyncProgress:
+    """
+    progress of the providers of a run, a listener of the journal. it is updated by the sync thread and
+    read by the ui through snapshots
+    """
+
+    def __init__(self, providers: list[str] = ()):
+        self._lock = threading.Lock()
+        self._providers = {provider: ProviderProgress(provider) for provider in providers}
+
+    def _get(self, provider: str) -> ProviderProgress:
+        if provider not in self._providers:
+            self._providers[provider] = ProviderProgress(provider)
+        return self._providers[provider]
+
+    def record_provider(self, provider: str, status: str, error: str = None):
+        with self._lock:
+            progress = self._get(provider)
+            progress.status = status
+            if status == "running":
+                progress.started_at = time.monotonic()
+                progress.finished_at = None
+            else:
+                progress.finished_at = time.monotonic()
+
+    def record_stage(self, provider: str, invoice: Invoice, stage: str, error: str = None):
+        with self._lock:
+            progress = self._get(provider)
+            if error is not None:
+                progress.failed += 1
+            elif stage in COMPLETED_STAGES:
+                setattr(progress, stage, getattr(progress, stage) + 1)
+
+    def snapshot(self) -> list[ProviderProgress]:
+        with self._lock:
+            return [replace(progress) for progress in self._providers.values()]
@@ -1,13 +1,46 @@
+import asyncio
+import hashlib
+import io
+import os
+import threading
+import time
 from abc import ABC
+from collections.abc import Awaitable, Callable, Iterable, Iterator
 from datetime import date
-from io import BytesIO
+from tempfile import SpooledTemporaryFile
+from typing import TYPE_CHECKING
+from urllib.parse import urljoin, urlsplit
 
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
-from playwright.async_api import Page
-from pydantic import BaseModel
+from bs4 import BeautifulSoup
+from googleapiclient.errors import HttpError
+from playwright.async_api import Page, Route, TimeoutError as PlaywrightTimeoutError
+from pydantic import BaseModel, TypeAdapter
 
+from bolletta_sync import tracing
+from bolletta_sync.google_gateway import GoogleGateway
+from bolletta_sync.http_client import HttpClient, override_url
 from bolletta_sync.main import logger
+from bolletta_sync.namespace import NamespaceResolver
+from bolletta_sync.resilience import RETRY_ATTEMPTS, backoff_delay
+from bolletta_sync.task_index import TaskIndex
+
+if TYPE_CHECKING:
+    from bolletta_sync.sinks.base_sink import BaseSink
+
+TASKLIST_NAME = "Bollette"
+# parse the listed dates the same way the Invoice model does
+DATE_ADAPTER = TypeAdapter(date)
+DOWNLOAD_SPOOL_SIZE = int(os.getenv("DOWNLOAD_SPOOL_SIZE", str(1024 * 1024)))
+# resource types loaded by the browser pages, the login flows do not need images, media, fonts or beacons
+ALLOWED_RESOURCE_TYPES = frozenset({"document", "script", "stylesheet", "xhr", "fetch", "other"})
+# analytics, advertising and tracking hosts, blocked together with their subdomains
+BLOCKED_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "googleadservices.com", "googlesyndication.com", "doubleclick.net",
+    "facebook.net", "facebook.com", "hotjar.com", "clarity.ms", "bing.com", "criteo.com",
+    "criteo.net", "adnxs.com", "taboola.com", "outbrain.com", "tiktok.com", "linkedin.com", "licdn.com",
+    "scorecardresearch.com", "quantserve.com", "contentsquare.net", "nr-data.net", "newrelic.com", "dynatrace.com",
+    "adobedtm.com", "demdex.net", "omtrdc.net", "yahoo.com", "pinterest.com", "twitter.com", "ads-twitter.com",
+)
 
 
 class Invoice(BaseModel):
@@ -19,63 +52,276 @@ class Invoice(BaseModel):
     metadata: dict = None
 
 
+class InvoicePdf(SpooledTemporaryFile):
+    """
+    temporary file of a downloaded pdf, hashed with md5 and sha256 and sized while it is written
+    """
+
+    def __init__(self, max_size: int = DOWNLOAD_SPOOL_SIZE):
+        super().__init__(max_size=max_size)
+        self._md5 = hashlib.md5()
+        self._sha256 = hashlib.sha256()
+        self._read_lock = threading.Lock()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        self._md5.update(data)
+        self._sha256.update(data)
+        return super().write(data)
+
+    @property
+    def md5(self) -> str:
+        return self._md5.hexdigest()
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        with self._read_lock:
+            self.seek(offset)
+            return self.read(size)
+
+    def open_reader(self) -> "InvoicePdfReader":
+        return InvoicePdfReader(self)
+
+
+class InvoicePdfReader(io.RawIOBase):
+    """
+    reader of a downloaded pdf with a position of its own, the sinks read the same pdf from their threads at once
+    """
+
+    def __init__(self, invoice_pdf: InvoicePdf):
+        super().__init__()
+        self._invoice_pdf = invoice_pdf
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._invoice_pdf.size
+        self._position = max(offset, 0)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        data = self._invoice_pdf.read_at(self._position, len(buffer))
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+def match_host(host: str, hosts: tuple[str, ...]) -> bool:
+    return any(host == listed_host or host.endswith("." + listed_host) for listed_host in hosts)
+
+
 class BaseProvider(ABC):
-    def __init__(self, google_credentials, page: Page, namespace: str):
-        self._google_credentials = google_credentials
-        self.page = page
+    username_env: str = None
+    # whether the provider implements _login_http, the login form posted without the browser
+    http_login: bool = False
+    # request interception of the browser pages, overridden by the providers that need more
+    allowed_resource_types: frozenset[str] = ALLOWED_RESOURCE_TYPES
+
+    def __init__(self, google_gateway: GoogleGateway, namespace_resolver: NamespaceResolver,
+                 page_factory: Callable[[], Awaitable[Page]], namespace: str, account: str = None):
+        self._google_gateway = google_gateway
+        self._namespace_resolver = namespace_resolver
+        self.account = account
+        self._page_factory = page_factory
+        self.page: Page = None
         self._namespace = namespace
-        self.namespace_folder_id = None
+        self.auth_mode = os.getenv(f"{namespace.upper()}_AUTH", "http")
+        self.block_resources = os.getenv(f"{namespace.upper()}_BLOCK_RESOURCES", "true") == "true"
+        self.blocked_requests = 0
+        self.login_duration: float = None
+        self.logged_in = False
+        self.client_codes: list[str] = []
         self.namespace_tasklist_id = None
+        self.http_client = HttpClient()
 
-        self.drive_service = build("drive", "v3", credentials=self._google_credentials, cache_discovery=False)
-        self.tasks_service = build("tasks", "v1", credentials=self._google_credentials, cache_discovery=False)
-
-    async def get_cookies(self) -> dict:
-        cookies = {}
-        for cookie in await self.page.context.cookies():
-            cookies[cookie['name']] = cookie['value']
-        return cookies
-
-    def _create_folder(self, folder_name: str, parent_folder_id: str = None) -> str:
-        query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
-        if parent_folder_id:
-            query += f" and '{parent_folder_id}' in parents"
-        results = self.drive_service.files().list(
-            q=query,
-            spaces='drive'
-        ).execute()
-
-        if results.get('files'):
-            return results.get('files')[0].get('id')
-
-        folder_metadata = {
-            'name': folder_name,
-            'mimeType': 'application/vnd.google-apps.folder'
-        }
-        folder = self.drive_service.files().create(
-            body=folder_metadata,
-            fields='id'
-        ).execute()
-
-        return folder.get('id')
-
-    async def check_namespace(self) -> bool:
-        # google drive
-        bollette_folder_id = self._create_folder("bollette")
-        year_folder_id = self._create_folder(str(date.today().year), bollette_folder_id)
-        self.namespace_folder_id = self._create_folder(self._namespace, year_folder_id)
-
-        # google tasks
-        tasklist_name = "Bollette"
-        tasklists = self.tasks_service.tasklists().list().execute()
-        self.namespace_tasklist_id = None
-        for tasklist in tasklists.get('items', []):
-            if tasklist['title'] == tasklist_name:
-                self.namespace_tasklist_id = tasklist['id']
-                break
-        if not self.namespace_tasklist_id:
-            tasklist = self.tasks_service.tasklists().insert(body={'title': tasklist_name}).execute()
-            self.namespace_tasklist_id = tasklist['id']
+        self.tasks_service = google_gateway.tasks_service
+
+    @classmethod
+    def get_accounts(cls) -> list[str | None]:
+        """
+        return the accounts of the provider that are synced in isolated sessions
+        """
+        return [None]
+
+    async def open_page(self) -> Page:
+        """
+        open the browser page, the cookies of the http client are copied into the browser session
+        """
+        if self.page is None:
+            self.page = await self._page_factory()
+            if self.block_resources:
+                await self.page.context.route("**/*", self._route_request)
+            cookies = self.http_client.get_cookies()
+            if cookies:
+                await self.page.context.add_cookies(cookies)
+        return self.page
+
+    def _is_request_allowed(self, resource_type: str, url: str) -> bool:
+        host = urlsplit(url).hostname or ""
+        return resource_type in self.allowed_resource_types and not match_host(host, BLOCKED_HOSTS)
+
+    async def _route_request(self, route: Route):
+        """
+        abort the requests of the browser pages that are not needed to login
+        """
+        if self._is_request_allowed(route.request.resource_type, route.request.url):
+            await route.fallback()
+        else:
+            self.blocked_requests += 1
+            await route.abort("blockedbyclient")
+
+    async def goto(self, url: str, **kwargs):
+        """
+        navigate the browser page to the url, retrying with backoff when the navigation times out
+        """
+        page = await self.open_page()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await page.goto(override_url(url), **kwargs)
+            except PlaywrightTimeoutError as e:
+                if attempt > RETRY_ATTEMPTS:
+                    raise e
+                logger.warning(f"{self._namespace} - navigation to {url} timed out, retrying")
+                await asyncio.sleep(backoff_delay(attempt))
+
+    async def sync_cookies(self):
+        """
+        copy the cookies of the browser session into the http client
+        """
+        if self.page is not None:
+            self.http_client.set_cookies(await self.page.context.cookies())
+
+    async def get_storage_state(self) -> dict:
+        if self.page is not None:
+            return await self.page.context.storage_state()
+        return {"cookies": self.http_client.get_cookies(), "origins": []}
+
+    def restore_storage_state(self, storage_state: dict):
+        self.http_client.set_cookies(storage_state.get("cookies", []))
+
+    async def close(self):
+        await self.http_client.close()
+        if self.page is not None:
+            await self.page.context.close()
+
+    async def login(self):
+        """
+        login to the provider, the browser session is reused when still valid.
+        with the http auth mode the login form is posted without the browser, falling back to the browser on failure
+        """
+        started_at = time.perf_counter()
+        try:
+            with tracing.span("login", provider=self._namespace) as span:
+                if await self._check_session():
+                    logger.info(f"{self._namespace} - session restored")
+                    span.set(method="session")
+                    self.logged_in = True
+                    return
+
+                if self.http_login and self.auth_mode == "http":
+                    try:
+                        await self._login_http()
+                        if await self._check_session():
+                            logger.info(f"{self._namespace} - logged in without browser")
+                            span.set(method="http")
+                            self.logged_in = True
+                            return
+                        logger.warning(f"{self._namespace} - http login rejected, falling back to browser")
+                    except Exception as e:
+                        logger.warning(f"{self._namespace} - http login failed cause: {e}, falling back to browser")
+
+                span.set(method="browser")
+                await self.open_page()
+                await self._login()
+                await self.sync_cookies()
+                self.logged_in = True
+                span.set(blocked_requests=self.blocked_requests)
+                if self.block_resources:
+                    logger.info(f"{self._namespace} - browser login done, {self.blocked_requests} requests blocked")
+        finally:
+            self.login_duration = time.perf_counter() - started_at
+
+    async def _login(self):
+        """
+        login to the provider with the browser
+        """
+        raise Exception("login not implemented")
+
+    async def _login_http(self):
+        """
+        login to the provider without the browser
+        """
+        raise Exception("http login not implemented")
+
+    async def _check_session(self) -> bool:
+        """
+        check with a lightweight authenticated request whether the session is still valid
+        """
+        return False
+
+    async def _post_login_form(self, url: str, username: str, password: str):
+        """
+        fill and post the form of the login page that contains the password field
+        """
+        response = await self.http_client.get(url)
+        response.raise_for_status()
+        soup = BeautifulSoup(response.text, "html.parser")
+
+        password_input = soup.find("input", {"type": "password"})
+        form = password_input.find_parent("form") if password_input else None
+        if form is None:
+            raise Exception("login form not found")
+        username_input = form.find("input", {"type": ["text", "email"]})
+        if username_input is None:
+            raise Exception("username field not found")
+
+        data = {i.get("name"): i.get("value", "") for i in form.find_all("input") if i.get("name")}
+        data[username_input.get("name")] = username
+        data[password_input.get("name")] = password
+
+        action = urljoin(str(response.url), form.get("action") or str(response.url))
+        response = await self.http_client.request(form.get("method", "post").upper(), action, data=data)
+        response.raise_for_status()
+
+    async def _get_task_index(self) -> TaskIndex:
+        try:
+            return await self._namespace_resolver.get_task_index(self.namespace_tasklist_id)
+        except HttpError as e:
+            if e.status_code != 404:
+                raise e
+            self._namespace_resolver.invalidate_tasklist(self.namespace_tasklist_id)
+            self.namespace_tasklist_id = await self._namespace_resolver.get_tasklist(TASKLIST_NAME)
+            return await self._namespace_resolver.get_task_index(self.namespace_tasklist_id)
+
+    async def check_namespace(self, invoices: list[Invoice], sinks: list["BaseSink"]) -> bool:
+        """
+        resolve the folders of the years of the invoices in the sinks and the google tasks tasklist
+        """
+        with tracing.span("namespace", provider=self._namespace):
+            # sinks
+            years = {invoice.doc_date.year for invoice in invoices}
+            await asyncio.gather(*(sink.prepare(self._namespace, years) for sink in sinks))
+
+            # google tasks
+            self.namespace_tasklist_id = await self._namespace_resolver.get_tasklist(TASKLIST_NAME)
+            await self._get_task_index()
 
         return True
 
@@ -85,58 +331,88 @@ class BaseProvider(ABC):
         """
         raise Exception("get invoices not implemented")
 
-    async def download_invoice(self, invoice: Invoice) -> bytes:
+    @staticmethod
+    def _filter_invoices(entries: Iterable[dict], get_doc_date: Callable[[dict], date],
+                         to_invoice: Callable[[dict], Invoice], start_date: date, end_date: date) -> Iterator[Invoice]:
+        """
+        yield the invoices of the listed entries issued between start_date and end_date, only the entries in range
+        are parsed. the entries are filtered one by one, the listings are not in a known order
+        """
+        for entry in entries:
+            if start_date <= get_doc_date(entry) <= end_date:
+                yield to_invoice(entry)
+
+    async def download_invoice(self, invoice: Invoice) -> InvoicePdf:
         """
         download the invoice from the provider
         """
         raise Exception("download invoice not implemented")
 
-    async def save_invoice(self, invoice: Invoice, invoice_pdf: bytes) -> bool:
+    async def _download_pdf(self, url: str, **kwargs) -> InvoicePdf:
         """
-        save the invoice to google drive
+        stream the pdf into a temporary file, kept in memory until DOWNLOAD_SPOOL_SIZE bytes
         """
-        file_name = f"{self._namespace}_{invoice.doc_date.strftime('%Y-%m-%d')}_{invoice.id}.pdf"
-        results = self.drive_service.files().list(
-            q=f"name='{file_name}' and '{self.namespace_folder_id}' in parents and trashed=false",
-            spaces='drive'
-        ).execute()
-        if results.get('files'):
-            logger.info(f"file {file_name} already exists in google drive")
-            return True
+        invoice_pdf = InvoicePdf()
+        try:
+            async with self.http_client.stream("GET", url, **kwargs) as response:
+                if response.status_code != 200:
+                    raise Exception(f"Failed to download invoice PDF: {response.url} HTTP {response.status_code}")
+                async for chunk in response.aiter_bytes():
+                    invoice_pdf.write(chunk)
+        except Exception as e:
+            invoice_pdf.close()
+            raise e
 
-        file_metadata = {
-            "name": file_name,
-            "parents": [self.namespace_folder_id]
-        }
-        media = MediaIoBaseUpload(BytesIO(invoice_pdf), mimetype="application/pdf")
-        file = self.drive_service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields="id"
-        ).execute()
+        invoice_pdf.seek(0)
+        return invoice_pdf
 
-        logger.info(f"create file {file_name} in google drive")
+    def _get_file_name(self, invoice: Invoice) -> str:
+        return f"{self._namespace}_{invoice.doc_date.strftime('%Y-%m-%d')}_{invoice.id}.pdf"
 
-        return True
-
-    async def set_expire_invoice(self, invoice: Invoice) -> bool:
-        """
-        set expire invoice to google tasks
-        """
-        task_title = f"Pagare {self._namespace} fattura {invoice.id}"
-        tasks = self.tasks_service.tasks().list(tasklist=self.namespace_tasklist_id).execute()
-        for task in tasks.get('items', []):
-            if task['title'] == task_title:
-                logger.info(f"task for invoice {invoice.id} already exists")
-                return True
+    def _get_task_title(self, invoice: Invoice) -> str:
+        return f"Pagare {self._namespace} fattura {invoice.id}"
 
+    def _insert_task_request(self, invoice: Invoice):
         task_metadata = {
-            'title': task_title,
+            'title': self._get_task_title(invoice),
             'due': invoice.due_date.strftime('%Y-%m-%dT00:00:00Z'),
             'notes': f'Totale: {invoice.amount}'
         }
-        task = self.tasks_service.tasks().insert(tasklist=self.namespace_tasklist_id, body=task_metadata).execute()
+        return self.tasks_service.tasks().insert(tasklist=self.namespace_tasklist_id, body=task_metadata)
+
+    async def get_task(self, invoice: Invoice) -> dict | None:
+        task_index = await self._get_task_index()
+        return task_index.get(self._get_task_title(invoice))
+
+    async def save_invoice(self, invoice: Invoice, invoice_pdf: InvoicePdf,
+                           sinks: list["BaseSink"]) -> dict[str, str | Exception]:
+        """
+        save the invoice to the sinks in parallel from the same downloaded pdf, return the id of its file in every
+        sink. a sink that failed returns its exception, the other sinks save the invoice anyway
+        """
+        file_name = self._get_file_name(invoice)
+        results = await asyncio.gather(*(sink.store(self._namespace, invoice, invoice_pdf, file_name)
+                                         for sink in sinks), return_exceptions=True)
+        return {sink.name: result for sink, result in zip(sinks, results)}
+
+    async def set_expire_invoices(self, invoices: list[Invoice]) -> bool:
+        """
+        set expire invoices to google tasks, the missing tasks are created in a single batch
+        """
+        task_index = await self._get_task_index()
+
+        new_invoices = []
+        for invoice in invoices:
+            if self._get_task_title(invoice) in task_index:
+                logger.info(f"task for invoice {invoice.id} already exists")
+            else:
+                new_invoices.append(invoice)
 
-        logger.info(f"created task for invoice {invoice.id}")
+        if new_invoices:
+            tasks = await self._google_gateway.execute_batch(
+                self.tasks_service, [self._insert_task_request(invoice) for invoice in new_invoices])
+            for invoice, task in zip(new_invoices, tasks):
+                task_index.add(task)
+                logger.info(f"created task for invoice {invoice.id}")
 
         return True
@@ -1,20 +1,27 @@
 import os
+from collections.abc import Awaitable, Callable
 from datetime import date, datetime
 
-import requests
 from playwright.async_api import Page
 from playwright_recaptcha import recaptchav2
 
-from bolletta_sync.providers.base_provider import BaseProvider, Invoice
+from bolletta_sync.google_gateway import GoogleGateway
+from bolletta_sync.namespace import NamespaceResolver
+from bolletta_sync.providers.base_provider import ALLOWED_RESOURCE_TYPES, BaseProvider, Invoice, InvoicePdf
 
 
 class Eni(BaseProvider):
-    def __init__(self, google_credentials, page: Page):
-        super().__init__(google_credentials, page, "eni")
+    username_env = "ENI_USERNAME"
+    # the recaptcha challenges load their images and audio
+    allowed_resource_types = ALLOWED_RESOURCE_TYPES | {"image", "media"}
+
+    def __init__(self, google_gateway: GoogleGateway, namespace_resolver: NamespaceResolver,
+                 page_factory: Callable[[], Awaitable[Page]], account: str = None):
+        super().__init__(google_gateway, namespace_resolver, page_factory, "eni", account)
         self.account_code = None
 
     async def _login_eni(self):
-        await self.page.goto("https://eniplenitude.com/my-eni/")
+        await self.goto("https://eniplenitude.com/my-eni/")
 
         async with recaptchav2.AsyncSolver(self.page) as solver:
             await self.page.get_by_role("listitem", name="Accept proposed privacy").click()
@@ -24,58 +31,52 @@ class Eni(BaseProvider):
 
             await self.page.get_by_role("textbox", name="password").fill(os.getenv("ENI_PASSWORD"))
             await self.page.get_by_role("button", name="Accedi").click()
-            await self.page.wait_for_timeout(1000)
+            # the password step shows a new recaptcha, wait for its unchecked checkbox
+            await self.page.frame_locator("iframe[title='reCAPTCHA']").last.locator(
+                "#recaptcha-anchor[aria-checked='false']").wait_for()
             await solver.solve_recaptcha(wait=True)
 
-        async with self.page.expect_navigation():
-            await self.page.get_by_role("button", name="Accedi").click()
+        # the login is done once the page leaves the password step
+        login_url = self.page.url
+        await self.page.get_by_role("button", name="Accedi").click()
+        await self.page.wait_for_url(lambda url: url != login_url)
+
+    async def _login(self):
+        await self._login_eni()
+
+    async def _check_session(self) -> bool:
+        response = await self.http_client.get(
+            "https://eniplenitude.com/serviceDAp/api/c360/init?logHash=wv5y2LVrjgcVRvW82WLEw3&channel=PORTAL")
+        return response.status_code == 200 and "codiceContoDefault" in response.text
 
     async def get_invoices(self, start_date: date, end_date: date) -> list[Invoice]:
         invoices: list[Invoice] = []
 
-        await self._login_eni()
+        await self.login()
 
-        response = requests.get(
-            "https://eniplenitude.com/serviceDAp/api/c360/init?logHash=wv5y2LVrjgcVRvW82WLEw3&channel=PORTAL",
-            cookies=await self.get_cookies())
+        response = await self.http_client.get(
+            "https://eniplenitude.com/serviceDAp/api/c360/init?logHash=wv5y2LVrjgcVRvW82WLEw3&channel=PORTAL")
         response.raise_for_status()
         self.account_code = response.json()["codiceContoDefault"]
         client_code = response.json()["codiceCliente"]
 
-        response = requests.get(
-            f"https://eniplenitude.com/serviceDAp/c360/api/conti/{self.account_code}/bollette?logHash=8yVXbTfuaHIvAS5PvRHgnp&channel=PORTAL",
-            cookies=await self.get_cookies()
+        response = await self.http_client.get(
+            f"https://eniplenitude.com/serviceDAp/c360/api/conti/{self.account_code}/bollette?logHash=8yVXbTfuaHIvAS5PvRHgnp&channel=PORTAL"
         )
         response.raise_for_status()
-        invoice_list = list(
-            map(lambda i: Invoice(id=i["numeroBolletta"],
-                                  doc_date=datetime.strptime(i["emissione"], "%d/%m/%Y"),
-                                  due_date=datetime.strptime(i["scadenza"], "%d/%m/%Y"),
-                                  amount=i["importo"],
-                                  client_code=client_code),
-                response.json()["bollette"]))
-        invoice_list_filtered = list(
-            filter(lambda invoice: start_date <= invoice.doc_date <= end_date, invoice_list))
-        if invoice_list_filtered:
-            invoices.extend(invoice_list_filtered)
+        invoices.extend(self._filter_invoices(
+            response.json()["bollette"],
+            lambda i: datetime.strptime(i["emissione"], "%d/%m/%Y").date(),
+            lambda i: Invoice(id=i["numeroBolletta"],
+                              doc_date=datetime.strptime(i["emissione"], "%d/%m/%Y"),
+                              due_date=datetime.strptime(i["scadenza"], "%d/%m/%Y"),
+                              amount=i["importo"],
+                              client_code=client_code),
+            start_date, end_date))
 
         return invoices
 
-    async def download_invoice(self, invoice: Invoice) -> bytes:
-        response = requests.get(
-            f"https://eniplenitude.com/serviceDAp/c360/api/conti/{self.account_code}/download-doc-pdf?numeroFattura={invoice.id}&logHash=0golQ74cfqlmjhg1O5pHyn&channel=PORTAL",
-            cookies=await self.get_cookies()
+    async def download_invoice(self, invoice: Invoice) -> InvoicePdf:
+        return await self._download_pdf(
+            f"https://eniplenitude.com/serviceDAp/c360/api/conti/{self.account_code}/download-doc-pdf?numeroFattura={invoice.id}&logHash=0golQ74cfqlmjhg1O5pHyn&channel=PORTAL"
         )
-
-        if response.status_code != 200:
-            raise Exception(f"Failed to download invoice PDF: {response.url} HTTP {response.status_code}")
-
-        return response.content
-
-    async def save_invoice(self, invoice: Invoice, invoice_pdf: bytes) -> bool:
-        result = await super().save_invoice(invoice, invoice_pdf)
-        return result
-
-    async def set_expire_invoice(self, invoice: Invoice) -> bool:
-        result = await super().set_expire_invoice(invoice)
-        return result
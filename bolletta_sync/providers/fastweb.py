@@ -1,23 +1,36 @@
 import os
+import re
+from collections.abc import Awaitable, Callable
 from datetime import date
+from urllib.parse import urljoin
 
-import requests
 from bs4 import BeautifulSoup
 from playwright.async_api import Page
 
+from bolletta_sync.google_gateway import GoogleGateway
 from bolletta_sync.main import logger
-from bolletta_sync.providers.base_provider import BaseProvider, Invoice
+from bolletta_sync.namespace import NamespaceResolver
+from bolletta_sync.providers.base_provider import BaseProvider, DATE_ADAPTER, Invoice, InvoicePdf
 
 
 class Fastweb(BaseProvider):
-    def __init__(self, google_credentials, page: Page):
-        super().__init__(google_credentials, page, "fastweb")
+    username_env = "FASTWEB_USERNAME"
+    http_login = True
+
+    def __init__(self, google_gateway: GoogleGateway, namespace_resolver: NamespaceResolver,
+                 page_factory: Callable[[], Awaitable[Page]], account: str = None):
+        super().__init__(google_gateway, namespace_resolver, page_factory, "fastweb", account)
+        self.client_codes = [account] if account else self.get_accounts()
+        self._selected_client_code = None
+
+    @classmethod
+    def get_accounts(cls) -> list[str | None]:
         if os.getenv("FASTWEB_CLIENT_CODE") is None:
             raise Exception("FASTWEB_CLIENT_CODE not set")
-        self.client_codes = os.getenv("FASTWEB_CLIENT_CODE").split(",")
+        return os.getenv("FASTWEB_CLIENT_CODE").split(",")
 
     async def _login_fastweb(self):
-        await self.page.goto("https://fastweb.it/myfastweb/accesso/login/")
+        await self.goto("https://fastweb.it/myfastweb/accesso/login/")
 
         await self.page.locator("iframe[title=\"Cookie center\"]").content_frame.get_by_role("button",
                                                                                              name="Accetta tutti").click()
@@ -26,70 +39,93 @@ class Fastweb(BaseProvider):
         await self.page.get_by_role("textbox", name="username").fill(os.getenv("FASTWEB_USERNAME"))
         await self.page.get_by_placeholder("password").click()
         await self.page.get_by_role("textbox", name="password").fill(os.getenv("FASTWEB_PASSWORD"))
-        async with self.page.expect_navigation():
-            await self.page.get_by_role("link", name="Accedi").click()
+        await self.page.get_by_role("link", name="Accedi").click()
+        await self.page.wait_for_url(re.compile(r"/myfastweb/(?!accesso/login/)"))
+
+    async def _login(self):
+        await self._login_fastweb()
+
+    async def _login_http(self):
+        await self._post_login_form("https://fastweb.it/myfastweb/accesso/login/", os.getenv("FASTWEB_USERNAME"),
+                                    os.getenv("FASTWEB_PASSWORD"))
+
+    async def _check_session(self) -> bool:
+        response = await self.http_client.get("https://fastweb.it/myfastweb/accesso/seleziona-codice-cliente/")
+        return response.status_code == 200 and "/accesso/login" not in response.url.path
+
+    async def _select_profile_http(self, client_code: str):
+        response = await self.http_client.get("https://fastweb.it/myfastweb/accesso/seleziona-codice-cliente/")
+        response.raise_for_status()
+        soup = BeautifulSoup(response.text, "html.parser")
+
+        client_code_input = soup.find("input", {"value": client_code})
+        form = client_code_input.find_parent("form") if client_code_input else None
+        if form is None:
+            raise Exception("client code not found")
+
+        data = {i.get("name"): i.get("value", "") for i in form.find_all("input")
+                if i.get("name") and i.get("type") not in ("radio", "checkbox")}
+        data[client_code_input.get("name")] = client_code
+        action = urljoin(str(response.url), form.get("action") or str(response.url))
+        response = await self.http_client.post(action, data=data)
+        response.raise_for_status()
 
     async def _select_profile(self, client_code: str):
-        await self.page.goto("https://fastweb.it/myfastweb/accesso/seleziona-codice-cliente/")
+        if self._selected_client_code == client_code:
+            return
+
+        if self.page is None:
+            try:
+                await self._select_profile_http(client_code)
+                self._selected_client_code = client_code
+                return
+            except Exception as e:
+                logger.warning(f"fastweb - http profile selection failed cause: {e}, falling back to browser")
+            await self.open_page()
+
+        await self.goto("https://fastweb.it/myfastweb/accesso/seleziona-codice-cliente/")
 
         try:
             await self.page.get_by_text(client_code).click()
-            async with self.page.expect_navigation():
-                await self.page.get_by_role("link", name="Avanti").click()
+            await self.page.get_by_role("link", name="Avanti").click()
+            await self.page.wait_for_url(re.compile(r"/myfastweb/(?!accesso/)"))
         except:
             raise Exception("invalid client code")
 
+        await self.sync_cookies()
+        self._selected_client_code = client_code
+
     async def get_invoices(self, start_date: date, end_date: date) -> list[Invoice]:
         invoices: list[Invoice] = []
 
-        await self._login_fastweb()
+        await self.login()
 
         for client_code in self.client_codes:
             logger.info(f"fastweb - getting invoices for client {client_code}")
             await self._select_profile(client_code)
 
-            response = requests.get("https://fastweb.it/myfastweb/abbonamento/le-mie-fatture/",
-                                    cookies=await self.get_cookies())
+            response = await self.http_client.get("https://fastweb.it/myfastweb/abbonamento/le-mie-fatture/")
             soup = BeautifulSoup(response.text, "html.parser")
 
             security_token = soup.find("input", {"name": "securityToken"}).get("value")
             payload = {"action": "loadInvoiceList", "securityToken": security_token}
-            response = requests.post(
+            response = await self.http_client.post(
                 "https://fastweb.it/myfastweb/abbonamento/le-mie-fatture/ajax/index.php",
-                payload,
+                data=payload,
                 params={"action": "loadInvoiceList"},
-                cookies=await self.get_cookies(),
             )
 
-            invoice_list = list(
-                map(lambda i: Invoice(id=i["NumDoc"], doc_date=i["DocDateYMD"], due_date=i["DocExpireDateYMD"],
-                                      amount=i["DocAmount"], client_code=client_code),
-                    response.json().get("invoiceList", [])))
-            invoice_list_filtered = list(
-                filter(lambda invoice: start_date <= invoice.doc_date <= end_date, invoice_list))
-            if invoice_list_filtered:
-                invoices.extend(invoice_list_filtered)
+            invoices.extend(self._filter_invoices(
+                response.json().get("invoiceList", []),
+                lambda i: DATE_ADAPTER.validate_python(i["DocDateYMD"]),
+                lambda i: Invoice(id=i["NumDoc"], doc_date=i["DocDateYMD"], due_date=i["DocExpireDateYMD"],
+                                  amount=i["DocAmount"], client_code=client_code),
+                start_date, end_date))
 
         return invoices
 
-    async def download_invoice(self, invoice: Invoice) -> bytes:
+    async def download_invoice(self, invoice: Invoice) -> InvoicePdf:
         await self._select_profile(invoice.client_code)
-        response = requests.get(
+        return await self._download_pdf(
             f"https://fastweb.it/myfastweb/abbonamento/le-mie-fatture/conto-fastweb/Conto-FASTWEB-{invoice.id}-{invoice.doc_date.strftime('%Y%m%d')}.pdf",
-            cookies=await self.get_cookies(),
         )
-
-        if response.status_code != 200:
-            raise Exception(f"Failed to download invoice PDF: {response.url} HTTP {response.status_code}")
-
-        invoice_pdf = response.content
-
-        return invoice_pdf
-
-    async def save_invoice(self, invoice: Invoice, invoice_pdf: bytes) -> bool:
-        result = await super().save_invoice(invoice, invoice_pdf)
-        return result
-
-    async def set_expire_invoice(self, invoice: Invoice) -> bool:
-        result = await super().set_expire_invoice(invoice)
-        return result
@@ -1,18 +1,25 @@
 import os
+import re
+from collections.abc import Awaitable, Callable
 from datetime import date
 
-import requests
 from playwright.async_api import Page
 
-from bolletta_sync.providers.base_provider import BaseProvider, Invoice
+from bolletta_sync.google_gateway import GoogleGateway
+from bolletta_sync.namespace import NamespaceResolver
+from bolletta_sync.providers.base_provider import BaseProvider, DATE_ADAPTER, Invoice, InvoicePdf
 
 
 class FastwebEnergia(BaseProvider):
-    def __init__(self, google_credentials, page: Page):
-        super().__init__(google_credentials, page, "fastweb_energia")
+    username_env = "FASTWEB_ENERGIA_USERNAME"
+    http_login = True
+
+    def __init__(self, google_gateway: GoogleGateway, namespace_resolver: NamespaceResolver,
+                 page_factory: Callable[[], Awaitable[Page]], account: str = None):
+        super().__init__(google_gateway, namespace_resolver, page_factory, "fastweb_energia", account)
 
     async def _login_fastweb_energia(self):
-        await self.page.goto("https://www.fastweb.it/myfastweb-energia/login/")
+        await self.goto("https://www.fastweb.it/myfastweb-energia/login/")
 
         await self.page.locator("iframe[title=\"Cookie center\"]").content_frame.get_by_role("button",
                                                                                              name="Accetta tutti").click()
@@ -21,49 +28,41 @@ class FastwebEnergia(BaseProvider):
         await self.page.get_by_role("textbox", name="username").fill(os.getenv("FASTWEB_ENERGIA_USERNAME"))
         await self.page.get_by_placeholder("password").click()
         await self.page.get_by_role("textbox", name="password").fill(os.getenv("FASTWEB_ENERGIA_PASSWORD"))
-        async with self.page.expect_navigation():
-            await self.page.get_by_role("link", name="Accedi").click()
+        await self.page.get_by_role("link", name="Accedi").click()
+        await self.page.wait_for_url(re.compile(r"/myfastweb-energia/(?!login/)"))
+
+    async def _login(self):
+        await self._login_fastweb_energia()
+
+    async def _login_http(self):
+        await self._post_login_form("https://www.fastweb.it/myfastweb-energia/login/",
+                                    os.getenv("FASTWEB_ENERGIA_USERNAME"), os.getenv("FASTWEB_ENERGIA_PASSWORD"))
+
+    async def _check_session(self) -> bool:
+        response = await self.http_client.get("https://www.fastweb.it/myfastweb-energia/")
+        return response.status_code == 200 and "/login" not in response.url.path
 
     async def get_invoices(self, start_date: date, end_date: date) -> list[Invoice]:
         invoices: list[Invoice] = []
 
-        await self._login_fastweb_energia()
+        await self.login()
 
         payload = {"action": "loadInvoiceList"}
-        response = requests.post(
+        response = await self.http_client.post(
             "https://www.fastweb.it/myfastweb-energia/services/invoices/",
-            payload,
-            cookies=await self.get_cookies(),
+            data=payload,
         )
 
-        invoice_list = list(
-            map(lambda i: Invoice(id=i["NumDoc"], doc_date=i["DocDateYMD"], due_date=i["DocExpireDateYMD"],
-                                  amount=i["DocAmount"], client_code=os.getenv("FASTWEB_ENERGIA_USERNAME")),
-                response.json().get("invoiceList", [])))
-        invoice_list_filtered = list(
-            filter(lambda invoice: start_date <= invoice.doc_date <= end_date, invoice_list))
-        if invoice_list_filtered:
-            invoices.extend(invoice_list_filtered)
+        invoices.extend(self._filter_invoices(
+            response.json().get("invoiceList", []),
+            lambda i: DATE_ADAPTER.validate_python(i["DocDateYMD"]),
+            lambda i: Invoice(id=i["NumDoc"], doc_date=i["DocDateYMD"], due_date=i["DocExpireDateYMD"],
+                              amount=i["DocAmount"], client_code=os.getenv("FASTWEB_ENERGIA_USERNAME")),
+            start_date, end_date))
 
         return invoices
 
-    async def download_invoice(self, invoice: Invoice) -> bytes:
-        response = requests.get(
+    async def download_invoice(self, invoice: Invoice) -> InvoicePdf:
+        return await self._download_pdf(
             f"https://www.fastweb.it/myfastweb-energia/bollette/download/{invoice.id}-{invoice.doc_date}.pdf",
-            cookies=await self.get_cookies(),
         )
-
-        if response.status_code != 200:
-            raise Exception(f"Failed to download invoice PDF: {response.url} HTTP {response.status_code}")
-
-        invoice_pdf = response.content
-
-        return invoice_pdf
-
-    async def save_invoice(self, invoice: Invoice, invoice_pdf: bytes) -> bool:
-        result = await super().save_invoice(invoice, invoice_pdf)
-        return result
-
-    async def set_expire_invoice(self, invoice: Invoice) -> bool:
-        result = await super().set_expire_invoice(invoice)
-        return result
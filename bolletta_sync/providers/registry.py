@@ -0,0 +1,32 @@
+from functools import cache
+from importlib.metadata import EntryPoint
+
+from bolletta_sync.entry_points import load_entry_points
+
+ENTRY_POINT_GROUP = "bolletta_sync.providers"
+BUILTIN_PROVIDERS = {
+    "fastweb": "bolletta_sync.providers.fastweb:Fastweb",
+    "fastweb_energia": "bolletta_sync.providers.fastweb_energia:FastwebEnergia",
+    "eni": "bolletta_sync.providers.eni:Eni",
+    "umbra_acque": "bolletta_sync.providers.umbra_acque:UmbraAcque",
+}
+
+
+@cache
+def get_entry_points() -> dict[str, EntryPoint]:
+    return load_entry_points(ENTRY_POINT_GROUP, BUILTIN_PROVIDERS)
+
+
+def get_provider_names() -> list[str]:
+    return list(get_entry_points())
+
+
+@cache
+def load_provider(name: str) -> type:
+    """
+    import the module of the provider and return its BaseProvider subclass
+    """
+    entry_point = get_entry_points().get(name)
+    if entry_point is None:
+        raise Exception(f"Unknown provider {name}")
+    return entry_point.load()
@@ -1,22 +1,29 @@
 import logging
 import os
+import re
+from collections.abc import Awaitable, Callable
 from datetime import date, datetime
 from urllib.parse import unquote
 
-import requests
 from playwright.async_api import Page
 
-from bolletta_sync.providers.base_provider import BaseProvider, Invoice
+from bolletta_sync.google_gateway import GoogleGateway
+from bolletta_sync.namespace import NamespaceResolver
+from bolletta_sync.providers.base_provider import BaseProvider, Invoice, InvoicePdf
 
 logger = logging.getLogger(__name__)
 
 
 class UmbraAcque(BaseProvider):
-    def __init__(self, google_credentials, page: Page):
-        super().__init__(google_credentials, page, "umbra_acque")
+    username_env = "UMBRA_ACQUE_USERNAME"
+    http_login = True
+
+    def __init__(self, google_gateway: GoogleGateway, namespace_resolver: NamespaceResolver,
+                 page_factory: Callable[[], Awaitable[Page]], account: str = None):
+        super().__init__(google_gateway, namespace_resolver, page_factory, "umbra_acque", account)
 
     async def _login_umbra_acque(self):
-        await self.page.goto("https://self-service.umbraacque.com/umbraacque/login/")
+        await self.goto("https://self-service.umbraacque.com/umbraacque/login/")
 
         await self.page.get_by_role("button", name="Accetta tutti i cookie").click()
 
@@ -25,62 +32,56 @@ class UmbraAcque(BaseProvider):
         await self.page.get_by_role("textbox", name="Password").click()
         await self.page.get_by_role("textbox", name="Password").fill(os.getenv("UMBRA_ACQUE_PASSWORD"))
 
-        async with self.page.expect_navigation():
-            await self.page.get_by_role("button", name="ACCEDI").click()
+        await self.page.get_by_role("button", name="ACCEDI").click()
+        await self.page.wait_for_url(re.compile(r"/umbraacque/(?!login/)"))
+
+    async def _login(self):
+        await self._login_umbra_acque()
+
+    async def _login_http(self):
+        await self._post_login_form("https://self-service.umbraacque.com/umbraacque/login/",
+                                    os.getenv("UMBRA_ACQUE_USERNAME"), os.getenv("UMBRA_ACQUE_PASSWORD"))
+
+    async def _check_session(self) -> bool:
+        response = await self.http_client.get("https://self-service.umbraacque.com/bin/acea-myacea/utenze/", params={
+            "path": "/content/acea-myacea/umbraacque/selfcare/privato"})
+        return response.status_code == 200 and "contractPk" in response.text
 
     async def get_invoices(self, start_date: date, end_date: date) -> list[Invoice]:
         invoices: list[Invoice] = []
 
-        await self._login_umbra_acque()
+        await self.login()
 
-        response = requests.get("https://self-service.umbraacque.com/bin/acea-myacea/utenze/", params={
-            "path": "/content/acea-myacea/umbraacque/selfcare/privato"}, cookies=await self.get_cookies())
+        response = await self.http_client.get("https://self-service.umbraacque.com/bin/acea-myacea/utenze/", params={
+            "path": "/content/acea-myacea/umbraacque/selfcare/privato"})
         response.raise_for_status()
         contract_pk = response.json().get("data")[0]["contractPk"]
 
-        response = requests.get(
+        response = await self.http_client.get(
             "https://self-service.umbraacque.com/bin/acea-myacea/invoicesAndBalance/",
             params={
                 "path": "/content/acea-myacea/umbraacque/selfcare/fatture/jcr:content/content-private-par/invoices_table",
                 "contractPk": contract_pk
-            },
-            cookies=await self.get_cookies()
+            }
         )
         response.raise_for_status()
-        invoice_list = list(
-            map(lambda i: Invoice(id=i["invoiceNumber"],
-                                  doc_date=datetime.strptime(i["issueDate"], "%d/%m/%Y"),
-                                  due_date=datetime.strptime(i["expiryDate"], "%d/%m/%Y"),
-                                  amount=i["total"],
-                                  metadata={"code": unquote(i["documentLink"]).split("&path=")[0]},
-                                  client_code=i["contractId"]),
-                response.json().get("body")["invoices"]))
-        invoice_list_filtered = list(
-            filter(lambda invoice: start_date <= invoice.doc_date <= end_date, invoice_list))
-        if invoice_list_filtered:
-            invoices.extend(invoice_list_filtered)
+        invoices.extend(self._filter_invoices(
+            response.json().get("body")["invoices"],
+            lambda i: datetime.strptime(i["issueDate"], "%d/%m/%Y").date(),
+            lambda i: Invoice(id=i["invoiceNumber"],
+                              doc_date=datetime.strptime(i["issueDate"], "%d/%m/%Y"),
+                              due_date=datetime.strptime(i["expiryDate"], "%d/%m/%Y"),
+                              amount=i["total"],
+                              metadata={"code": unquote(i["documentLink"]).split("&path=")[0]},
+                              client_code=i["contractId"]),
+            start_date, end_date))
 
         return invoices
 
-    async def download_invoice(self, invoice: Invoice) -> bytes:
-        response = requests.get(
+    async def download_invoice(self, invoice: Invoice) -> InvoicePdf:
+        return await self._download_pdf(
             "https://self-service.umbraacque.com/bin/acea-myacea/download/",
             params={
                 "code": invoice.metadata["code"],
                 "path": "/content/acea-myacea/umbraacque/selfcare/fatture/jcr:content/content-private-par/invoices_table"
-            }, cookies=await self.get_cookies())
-
-        if response.status_code != 200:
-            raise Exception(f"Failed to download invoice PDF: {response.url} HTTP {response.status_code}")
-
-        invoice_pdf = response.content
-
-        return invoice_pdf
-
-    async def save_invoice(self, invoice: Invoice, invoice_pdf: bytes) -> bool:
-        result = await super().save_invoice(invoice, invoice_pdf)
-        return result
-
-    async def set_expire_invoice(self, invoice: Invoice) -> bool:
-        result = await super().set_expire_invoice(invoice)
-        return result
+            })
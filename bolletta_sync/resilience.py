@@ -0,0 +1,112 @@
+import asyncio
+import email.utils
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "4"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "1"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "60"))
+
+
+def backoff_delay(attempt: int, retry_after: float = None) -> float:
+    """
+    exponential backoff with full jitter for the attempt (starting from 1), never shorter than retry_after
+    """
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, RETRY_MAX_DELAY))
+    return delay
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    return the seconds to wait from a Retry-After header, given either in seconds or as an http date
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+class TokenBucket:
+    """
+    rate limiter that lets through rate requests per second, with bursts of up to capacity requests.
+    a rate of 0 disables the limit
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+    def defer(self, seconds: float):
+        """
+        hold back the next requests for the given seconds, as asked by a Retry-After header
+        """
+        if self.rate <= 0:
+            return
+        self._refill()
+        self._tokens = min(self._tokens, 1 - seconds * self.rate)
+
+
+class AdaptiveLimiter:
+    """
+    concurrency limit adapted in AIMD style: it grows by one after limit consecutive successes,
+    up to max_limit, and it is halved every time the server throttles the requests
+    """
+
+    def __init__(self, limit: int, max_limit: int = None, min_limit: int = 1):
+        self.limit = max(limit, min_limit)
+        self.max_limit = max(max_limit or limit, self.limit)
+        self.min_limit = min_limit
+        self._in_flight = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+    async def __aexit__(self, *exc_info):
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.max_limit:
+            self.limit += 1
+            self._successes = 0
+
+    def on_throttle(self):
+        self.limit = max(self.min_limit, self.limit // 2)
+        self._successes = 0
@@ -0,0 +1,53 @@
+import hashlib
+import json
+import os
+
+from cryptography.fernet import Fernet, InvalidToken
+
+
+class SessionCache:
+    """
+    encrypted cache of the playwright storage state of every provider account
+    """
+
+    def __init__(self, path: str, key: bytes):
+        self._path = path
+        self._fernet = Fernet(key)
+        os.makedirs(self._path, exist_ok=True)
+
+    @staticmethod
+    def load_key(key_file: str) -> bytes:
+        """
+        return the SESSION_CACHE_KEY environment variable, or the key stored in key_file creating it on first use
+        """
+        if os.getenv("SESSION_CACHE_KEY"):
+            return os.getenv("SESSION_CACHE_KEY").encode()
+        if not os.path.exists(key_file):
+            with open(os.open(key_file, os.O_WRONLY | os.O_CREAT, 0o600), "wb") as f:
+                f.write(Fernet.generate_key())
+        with open(key_file, "rb") as f:
+            return f.read().strip()
+
+    def _get_file(self, account: str) -> str:
+        return os.path.join(self._path, hashlib.sha256(account.encode()).hexdigest())
+
+    def load(self, account: str) -> dict | None:
+        file = self._get_file(account)
+        if not os.path.exists(file):
+            return None
+        try:
+            with open(file, "rb") as f:
+                return json.loads(self._fernet.decrypt(f.read()))
+        except (InvalidToken, ValueError):
+            return None
+
+    def save(self, account: str, storage_state: dict):
+        file = self._get_file(account)
+        with open(file + ".tmp", "wb") as f:
+            f.write(self._fernet.encrypt(json.dumps(storage_state).encode()))
+        os.replace(file + ".tmp", file)
+
+    def delete(self, account: str):
+        file = self._get_file(account)
+        if os.path.exists(file):
+            os.remove(file)
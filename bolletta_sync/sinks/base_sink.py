@@ -0,0 +1,70 @@
+import asyncio
+import os
+from abc import ABC
+
+from bolletta_sync import tracing
+from bolletta_sync.main import SyncContext
+from bolletta_sync.providers.base_provider import Invoice, InvoicePdf
+
+# what to do when a pdf already in a sink changed: upload a new "revision" or store a versioned "copy"
+CHANGED_INVOICE_POLICY = os.getenv("CHANGED_INVOICE_POLICY", "revision")
+
+
+class BaseSink(ABC):
+    """
+    storage of the invoice pdfs, the pdfs are saved by year and provider. a sink writes at most concurrency pdfs
+    at once and checks up to batch_size files in a single call
+    """
+    name: str = None
+
+    def __init__(self, concurrency: int, batch_size: int):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    @classmethod
+    def from_context(cls, context: SyncContext) -> "BaseSink":
+        """
+        create the sink from the services shared by the syncs, a sink that needs one of them overrides this
+        """
+        return cls()
+
+    async def prepare(self, namespace: str, years: set[int]):
+        """
+        resolve the folders of the years of the provider before its invoices are saved
+        """
+        pass
+
+    async def refresh(self):
+        """
+        forget what the sink cached of its storage, called at the start of every run
+        """
+        pass
+
+    async def store(self, namespace: str, invoice: Invoice, invoice_pdf: InvoicePdf, file_name: str) -> str:
+        """
+        save the pdf within the concurrency of the sink
+        """
+        async with self._semaphore:
+            with tracing.span("save", sink=self.name, invoice=invoice.id):
+                return await self.save(namespace, invoice, invoice_pdf, file_name)
+
+    async def save(self, namespace: str, invoice: Invoice, invoice_pdf: InvoicePdf, file_name: str) -> str:
+        """
+        save the pdf and return the id of its file. an identical file is kept, a changed one gets a new revision
+        or a versioned copy
+        """
+        raise Exception("save not implemented")
+
+    async def get_missing(self, file_ids: list[str]) -> set[str]:
+        """
+        return the ids of the files no longer in the sink
+        """
+        raise Exception("get missing not implemented")
+
+    async def close(self):
+        pass
+
+    @staticmethod
+    def _get_copy_name(file_name: str, invoice_pdf: InvoicePdf) -> str:
+        return f"{file_name.removesuffix('.pdf')}_{invoice_pdf.sha256[:8]}.pdf"
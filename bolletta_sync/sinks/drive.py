@@ -0,0 +1,150 @@
+import asyncio
+import os
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload
+
+from bolletta_sync.drive_index import DriveIndex
+from bolletta_sync.google_gateway import GOOGLE_BATCH_SIZE, GoogleGateway
+from bolletta_sync.main import SyncContext, logger
+from bolletta_sync.namespace import NamespaceResolver
+from bolletta_sync.providers.base_provider import Invoice, InvoicePdf
+from bolletta_sync.sinks.base_sink import BaseSink, CHANGED_INVOICE_POLICY
+
+# uploads of all the providers at once, the google gateway bounds their api calls with its adaptive limit
+DRIVE_SINK_CONCURRENCY = int(os.getenv("DRIVE_SINK_CONCURRENCY", "16"))
+# the chunks of a resumable upload must be a multiple of 256 KB
+DRIVE_UPLOAD_CHUNK_SIZE = max(int(os.getenv("DRIVE_UPLOAD_CHUNK_SIZE", str(5 * 1024 * 1024))) // (256 * 1024),
+                              1) * 256 * 1024
+
+
+class DriveSink(BaseSink):
+    """
+    save the pdfs to google drive, in the folders bollette/<year>/<provider>. the files of every folder are listed
+    once in a DriveIndex, so an existing pdf is found by name or md5 without further api calls
+    """
+    name = "drive"
+
+    def __init__(self, google_gateway: GoogleGateway, namespace_resolver: NamespaceResolver,
+                 concurrency: int = DRIVE_SINK_CONCURRENCY, batch_size: int = GOOGLE_BATCH_SIZE):
+        super().__init__(concurrency, batch_size)
+        self._google_gateway = google_gateway
+        self._namespace_resolver = namespace_resolver
+        self.drive_service = google_gateway.drive_service
+        self._drive_indexes: dict[tuple[str, int], DriveIndex] = {}
+
+    @classmethod
+    def from_context(cls, context: SyncContext) -> "DriveSink":
+        return cls(context.google_gateway, context.namespace_resolver)
+
+    async def _load_year_namespace(self, namespace: str, year: int):
+        folder_id = await self._namespace_resolver.get_namespace_folder(namespace, year)
+        try:
+            drive_index = await self._namespace_resolver.get_drive_index(folder_id)
+        except HttpError as e:
+            if e.status_code != 404:
+                raise e
+            self._namespace_resolver.invalidate_folder(folder_id)
+            folder_id = await self._namespace_resolver.get_namespace_folder(namespace, year)
+            drive_index = await self._namespace_resolver.get_drive_index(folder_id)
+        self._drive_indexes[(namespace, year)] = drive_index
+
+    async def prepare(self, namespace: str, years: set[int]):
+        await asyncio.gather(*(self._load_year_namespace(namespace, year) for year in years
+                               if (namespace, year) not in self._drive_indexes))
+
+    async def refresh(self):
+        # the indexes are listed again by the namespace resolver, the deleted folders are resolved again
+        self._drive_indexes.clear()
+
+    async def _get_drive_index(self, namespace: str, invoice: Invoice) -> DriveIndex:
+        if (namespace, invoice.doc_date.year) not in self._drive_indexes:
+            await self._load_year_namespace(namespace, invoice.doc_date.year)
+        return self._drive_indexes[(namespace, invoice.doc_date.year)]
+
+    def _get_media(self, invoice_pdf: InvoicePdf) -> MediaIoBaseUpload:
+        return MediaIoBaseUpload(invoice_pdf.open_reader(), mimetype="application/pdf",
+                                 chunksize=DRIVE_UPLOAD_CHUNK_SIZE, resumable=True)
+
+    async def _upload_invoice(self, namespace: str, invoice: Invoice, invoice_pdf: InvoicePdf,
+                              file_name: str) -> dict:
+        drive_index = await self._get_drive_index(namespace, invoice)
+        file_metadata = {
+            "name": file_name,
+            "parents": [drive_index.folder_id]
+        }
+        file = await self._google_gateway.execute_resumable(self.drive_service.files().create(
+            body=file_metadata,
+            media_body=self._get_media(invoice_pdf),
+            fields="id, name, size, md5Checksum"
+        ))
+        drive_index.add(file)
+        return file
+
+    async def _update_invoice(self, namespace: str, invoice: Invoice, invoice_pdf: InvoicePdf,
+                              drive_file: dict) -> dict:
+        file = await self._google_gateway.execute_resumable(self.drive_service.files().update(
+            fileId=drive_file["id"],
+            media_body=self._get_media(invoice_pdf),
+            fields="id, name, size, md5Checksum"
+        ))
+        (await self._get_drive_index(namespace, invoice)).add(file)
+        return file
+
+    async def save(self, namespace: str, invoice: Invoice, invoice_pdf: InvoicePdf, file_name: str) -> str:
+        """
+        the pdf is compared by md5 with the files of the folder: an identical file is kept, a changed one gets
+        a new revision or a versioned copy
+        """
+        drive_index = await self._get_drive_index(namespace, invoice)
+        drive_file = drive_index.get(file_name)
+        if drive_file is not None and drive_file.get("md5Checksum") == invoice_pdf.md5:
+            logger.info(f"file {file_name} already exists in google drive")
+            return drive_file["id"]
+
+        same_file = drive_index.get_by_md5(invoice_pdf.md5)
+        if same_file is not None:
+            logger.info(f"file {file_name} already exists in google drive as {same_file['name']}")
+            return same_file["id"]
+
+        if drive_file is not None:
+            if CHANGED_INVOICE_POLICY == "revision":
+                file = await self._update_invoice(namespace, invoice, invoice_pdf, drive_file)
+                logger.info(f"file {file_name} changed, uploaded a new revision to google drive")
+                return file["id"]
+            copy_name = self._get_copy_name(file_name, invoice_pdf)
+            logger.info(f"file {file_name} changed, storing the copy {copy_name}")
+            file_name = copy_name
+
+        try:
+            file = await self._upload_invoice(namespace, invoice, invoice_pdf, file_name)
+        except HttpError as e:
+            if e.status_code != 404:
+                raise e
+            # the cached folder was deleted from google drive
+            self._namespace_resolver.invalidate_folder(drive_index.folder_id)
+            await self._load_year_namespace(namespace, invoice.doc_date.year)
+            file = await self._upload_invoice(namespace, invoice, invoice_pdf, file_name)
+
+        logger.info(f"create file {file_name} in google drive")
+
+        return file["id"]
+
+    async def get_missing(self, file_ids: list[str]) -> set[str]:
+        """
+        the files deleted or trashed in google drive, checked in a batch request
+        """
+        results = await self._google_gateway.execute_batch(
+            self.drive_service, [self.drive_service.files().get(fileId=file_id, fields="id, trashed")
+                                 for file_id in file_ids],
+            return_exceptions=True)
+
+        missing = set()
+        for file_id, result in zip(file_ids, results):
+            is_deleted = isinstance(result, HttpError) and result.status_code == 404
+            is_trashed = isinstance(result, dict) and result.get("trashed")
+            if is_deleted or is_trashed:
+                missing.add(file_id)
+            elif isinstance(result, Exception):
+                raise result
+        return missing
@@ -0,0 +1,84 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+
+from bolletta_sync.main import base_path, logger
+from bolletta_sync.providers.base_provider import Invoice, InvoicePdf
+from bolletta_sync.sinks.base_sink import BaseSink, CHANGED_INVOICE_POLICY
+
+LOCAL_SINK_PATH = os.getenv("LOCAL_SINK_PATH") or os.path.join(base_path, "archive")
+LOCAL_SINK_CONCURRENCY = int(os.getenv("LOCAL_SINK_CONCURRENCY", "8"))
+LOCAL_SINK_BATCH_SIZE = int(os.getenv("LOCAL_SINK_BATCH_SIZE", "500"))
+
+
+def get_sha256(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class LocalSink(BaseSink):
+    """
+    archive the pdfs in a local directory, in the folders <year>/<provider>. a pdf is written to a temporary file
+    of its folder and renamed, so the archive never holds a partial file. the id of a file is its relative path
+    """
+    name = "local"
+
+    def __init__(self, concurrency: int = LOCAL_SINK_CONCURRENCY, batch_size: int = LOCAL_SINK_BATCH_SIZE,
+                 path: str = LOCAL_SINK_PATH):
+        super().__init__(concurrency, batch_size)
+        self.path = path
+
+    async def prepare(self, namespace: str, years: set[int]):
+        for year in years:
+            os.makedirs(os.path.join(self.path, str(year), namespace), exist_ok=True)
+
+    async def save(self, namespace: str, invoice: Invoice, invoice_pdf: InvoicePdf, file_name: str) -> str:
+        return await asyncio.to_thread(self._save, namespace, invoice, invoice_pdf, file_name)
+
+    def _save(self, namespace: str, invoice: Invoice, invoice_pdf: InvoicePdf, file_name: str) -> str:
+        folder = f"{invoice.doc_date.year}/{namespace}"
+        path = os.path.join(self.path, folder, file_name)
+        if os.path.exists(path):
+            if get_sha256(path) == invoice_pdf.sha256:
+                logger.info(f"file {file_name} already exists in the local archive")
+                return f"{folder}/{file_name}"
+            if CHANGED_INVOICE_POLICY == "revision":
+                logger.info(f"file {file_name} changed, replaced in the local archive")
+            else:
+                copy_name = self._get_copy_name(file_name, invoice_pdf)
+                logger.info(f"file {file_name} changed, storing the copy {copy_name}")
+                file_name = copy_name
+                path = os.path.join(self.path, folder, file_name)
+
+        self._write_atomic(path, invoice_pdf)
+        logger.info(f"create file {file_name} in the local archive")
+        return f"{folder}/{file_name}"
+
+    @staticmethod
+    def _write_atomic(path: str, invoice_pdf: InvoicePdf):
+        folder = os.path.dirname(path)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                shutil.copyfileobj(invoice_pdf.open_reader(), f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException as e:
+            os.remove(tmp_path)
+            raise e
+        # persist the rename, the directories cannot be opened on windows
+        if os.name == "posix":
+            folder_fd = os.open(folder, os.O_RDONLY)
+            try:
+                os.fsync(folder_fd)
+            finally:
+                os.close(folder_fd)
+
+    async def get_missing(self, file_ids: list[str]) -> set[str]:
+        return {file_id for file_id in file_ids if not os.path.exists(os.path.join(self.path, file_id))}
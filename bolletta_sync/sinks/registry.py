@@ -0,0 +1,27 @@
+from functools import cache
+from importlib.metadata import EntryPoint
+
+from bolletta_sync.entry_points import load_entry_points
+
+ENTRY_POINT_GROUP = "bolletta_sync.sinks"
+BUILTIN_SINKS = {
+    "drive": "bolletta_sync.sinks.drive:DriveSink",
+    "local": "bolletta_sync.sinks.local:LocalSink",
+    "s3": "bolletta_sync.sinks.s3:S3Sink",
+}
+
+
+@cache
+def get_entry_points() -> dict[str, EntryPoint]:
+    return load_entry_points(ENTRY_POINT_GROUP, BUILTIN_SINKS)
+
+
+@cache
+def load_sink(name: str) -> type:
+    """
+    import the module of the sink and return its BaseSink subclass
+    """
+    entry_point = get_entry_points().get(name)
+    if entry_point is None:
+        raise Exception(f"Unknown sink {name}")
+    return entry_point.load()
@@ -0,0 +1,168 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from bolletta_sync.main import logger
+from bolletta_sync.providers.base_provider import Invoice, InvoicePdf
+from bolletta_sync.resilience import RETRY_ATTEMPTS
+from bolletta_sync.sinks.base_sink import BaseSink, CHANGED_INVOICE_POLICY
+
+S3_SINK_BUCKET = os.getenv("S3_SINK_BUCKET")
+S3_SINK_PREFIX = os.getenv("S3_SINK_PREFIX", "bollette")
+# the url of an s3 compatible store, e.g. minio, the buckets are addressed by path
+S3_SINK_ENDPOINT_URL = os.getenv("S3_SINK_ENDPOINT_URL")
+S3_SINK_REGION = os.getenv("S3_SINK_REGION")
+S3_SINK_CONCURRENCY = int(os.getenv("S3_SINK_CONCURRENCY", "8"))
+# keys listed per request, at most 1000
+S3_SINK_BATCH_SIZE = min(int(os.getenv("S3_SINK_BATCH_SIZE", "1000")), 1000)
+# the pdfs larger than this are uploaded in parts of this size
+S3_SINK_MULTIPART_SIZE = int(os.getenv("S3_SINK_MULTIPART_SIZE", str(8 * 1024 * 1024)))
+
+
+def get_md5(etag: str) -> str | None:
+    # the etag of an object uploaded in a single part is the md5 of its content
+    etag = etag.strip('"')
+    return None if "-" in etag else etag
+
+
+class S3Sink(BaseSink):
+    """
+    save the pdfs to a bucket of an s3 compatible object store, under <prefix>/<year>/<provider>/. the objects of
+    every folder are listed once, an existing pdf is found by key or md5 and its sha256 is kept in the object
+    metadata. the id of a file is its key. the blocking boto3 calls run on a pool of concurrency threads
+    """
+    name = "s3"
+
+    def __init__(self, concurrency: int = S3_SINK_CONCURRENCY, batch_size: int = S3_SINK_BATCH_SIZE,
+                 bucket: str = S3_SINK_BUCKET, prefix: str = S3_SINK_PREFIX, endpoint_url: str = S3_SINK_ENDPOINT_URL,
+                 region: str = S3_SINK_REGION):
+        super().__init__(concurrency, batch_size)
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.config import Config
+        except ImportError:
+            raise Exception("the s3 sink requires boto3, install bolletta-sync[s3]")
+        if not bucket:
+            raise Exception("the s3 sink requires S3_SINK_BUCKET")
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self._client = boto3.session.Session().client("s3", endpoint_url=endpoint_url, region_name=region,
+                                                      config=Config(
+            max_pool_connections=concurrency,
+            retries={"max_attempts": RETRY_ATTEMPTS + 1, "mode": "standard"},
+            s3={"addressing_style": "path"} if endpoint_url else None,
+            # the s3 compatible stores do not all support the default checksums of botocore
+            request_checksum_calculation="when_required",
+            response_checksum_validation="when_required",
+        ))
+        self._transfer_config = TransferConfig(multipart_threshold=S3_SINK_MULTIPART_SIZE,
+                                               multipart_chunksize=S3_SINK_MULTIPART_SIZE, use_threads=False)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="s3")
+        self._listed_folders: set[str] = set()
+        self._objects: dict[str, dict] = {}
+        self._checksums: dict[str, str] = {}
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _get_folder(self, namespace: str, year: int) -> str:
+        return "/".join(filter(None, [self.prefix, str(year), namespace])) + "/"
+
+    def _list(self, folder: str) -> list[dict]:
+        paginator = self._client.get_paginator("list_objects_v2")
+        return [item for page in paginator.paginate(Bucket=self.bucket, Prefix=folder,
+                                                    PaginationConfig={"PageSize": self.batch_size})
+                for item in page.get("Contents", [])]
+
+    def _add(self, key: str, md5: str | None):
+        self._remove(key)
+        self._objects[key] = {"key": key, "md5": md5}
+        if md5:
+            self._checksums[md5] = key
+
+    def _remove(self, key: str):
+        existing = self._objects.pop(key, None)
+        if existing is not None and existing["md5"] and self._checksums.get(existing["md5"]) == key:
+            del self._checksums[existing["md5"]]
+
+    async def _load_folder(self, folder: str):
+        for item in await self._run(self._list, folder):
+            self._add(item["Key"], get_md5(item["ETag"]))
+        self._listed_folders.add(folder)
+
+    async def prepare(self, namespace: str, years: set[int]):
+        folders = {self._get_folder(namespace, year) for year in years}
+        await asyncio.gather(*(self._load_folder(folder) for folder in folders - self._listed_folders))
+
+    async def refresh(self):
+        """
+        list again the folders already listed and update the objects in place, the saves of a concurrent run keep
+        their objects: a key is forgotten only when it was known before the listing and is no longer listed
+        """
+        folders = list(self._listed_folders)
+        known = {folder: {key for key in self._objects if key.startswith(folder)} for folder in folders}
+        listings = await asyncio.gather(*(self._run(self._list, folder) for folder in folders))
+        for folder, listing in zip(folders, listings):
+            listed = {item["Key"] for item in listing}
+            for key in known[folder] - listed:
+                self._remove(key)
+            for item in listing:
+                self._add(item["Key"], get_md5(item["ETag"]))
+
+    def _get_sha256(self, key: str) -> str | None:
+        response = self._client.head_object(Bucket=self.bucket, Key=key)
+        return response.get("Metadata", {}).get("sha256")
+
+    def _upload(self, key: str, invoice_pdf: InvoicePdf):
+        self._client.upload_fileobj(invoice_pdf.open_reader(), self.bucket, key, ExtraArgs={
+            "ContentType": "application/pdf",
+            "Metadata": {"sha256": invoice_pdf.sha256},
+        }, Config=self._transfer_config)
+
+    async def save(self, namespace: str, invoice: Invoice, invoice_pdf: InvoicePdf, file_name: str) -> str:
+        """
+        the pdf is compared by md5, or by the sha256 of the metadata, with the objects of the folder
+        """
+        folder = self._get_folder(namespace, invoice.doc_date.year)
+        key = folder + file_name
+        existing = self._objects.get(key)
+        if existing is not None and (existing["md5"] == invoice_pdf.md5 or (
+                existing["md5"] is None and await self._run(self._get_sha256, key) == invoice_pdf.sha256)):
+            logger.info(f"file {file_name} already exists in s3")
+            return key
+
+        same_key = self._checksums.get(invoice_pdf.md5)
+        if same_key is not None and same_key.startswith(folder):
+            logger.info(f"file {file_name} already exists in s3 as {same_key.removeprefix(folder)}")
+            return same_key
+
+        if existing is not None:
+            if CHANGED_INVOICE_POLICY == "revision":
+                # the previous revisions are kept by the versioning of the bucket, when enabled
+                await self._run(self._upload, key, invoice_pdf)
+                self._add(key, invoice_pdf.md5)
+                logger.info(f"file {file_name} changed, uploaded a new revision to s3")
+                return key
+            file_name = self._get_copy_name(file_name, invoice_pdf)
+            logger.info(f"file {key.removeprefix(folder)} changed, storing the copy {file_name}")
+            key = folder + file_name
+
+        await self._run(self._upload, key, invoice_pdf)
+        self._add(key, invoice_pdf.md5)
+        logger.info(f"create file {file_name} in s3")
+        return key
+
+    async def get_missing(self, file_ids: list[str]) -> set[str]:
+        """
+        the keys no longer in the bucket, found listing their folders
+        """
+        folders = {file_id.rsplit("/", 1)[0] + "/" for file_id in file_ids}
+        listings = await asyncio.gather(*(self._run(self._list, folder) for folder in folders))
+        keys = {item["Key"] for listing in listings for item in listing}
+        return {file_id for file_id in file_ids if file_id not in keys}
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
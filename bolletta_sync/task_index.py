@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+
+from bolletta_sync.google_gateway import GoogleGateway
+
+TASKS_PAGE_SIZE = 100
+
+
+class TaskIndex:
+    """
+    in-memory index of the tasks of a google tasks tasklist, keyed by task title
+    """
+
+    def __init__(self, google_gateway: GoogleGateway, tasklist_id: str):
+        self._google_gateway = google_gateway
+        self.tasklist_id = tasklist_id
+        self._tasks: dict[str, dict] = {}
+        self._loaded_at: datetime = None
+
+    async def load(self):
+        """
+        list the whole tasklist following the pagination, completed and hidden tasks included.
+        once loaded only the tasks updated since the previous load are fetched
+        """
+        tasks_service = self._google_gateway.tasks_service
+        loaded_at = datetime.now(timezone.utc)
+        updated_min = self._loaded_at.isoformat(timespec="seconds").replace("+00:00", "Z") if self._loaded_at else None
+        page_token = None
+        while True:
+            results = await self._google_gateway.execute(tasks_service.tasks().list(
+                tasklist=self.tasklist_id,
+                showCompleted=True,
+                showHidden=True,
+                showDeleted=updated_min is not None,
+                updatedMin=updated_min,
+                maxResults=TASKS_PAGE_SIZE,
+                pageToken=page_token
+            ))
+            for task in results.get('items', []):
+                if task.get('deleted'):
+                    self._tasks.pop(task['title'], None)
+                else:
+                    self.add(task)
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+        self._loaded_at = loaded_at
+
+    def get(self, title: str) -> dict | None:
+        return self._tasks.get(title)
+
+    def add(self, task: dict):
+        self._tasks[task['title']] = task
+
+    def __contains__(self, title: str) -> bool:
+        return title in self._tasks
+
+    def __len__(self) -> int:
+        return len(self._tasks)
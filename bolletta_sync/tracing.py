@@ -0,0 +1,221 @@
+import json
+import math
+import os
+import secrets
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+# attributes copied from the parent span, so every span can be grouped by provider and client
+INHERITED_ATTRIBUTES = ("provider", "client_code")
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """
+    value below which the given percent of the values fall, nearest-rank method
+    """
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+@dataclass
+class Span:
+    """
+    timed phase of a run, with its attributes and the counters (bytes, api calls) of the work done inside it
+    """
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_time: float
+    attributes: dict = field(default_factory=dict)
+    counters: dict[str, int] = field(default_factory=dict)
+    end_time: float = None
+    duration: float = 0
+    error: str = None
+    tracer: "Tracer" = field(default=None, repr=False)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def count(self, counter: str, value: int = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+                "start_time": self.start_time, "end_time": self.end_time, "duration": self.duration,
+                "attributes": self.attributes, "counters": self.counters, "error": self.error}
+
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    collect the spans of a run. the current span follows the asyncio tasks through a context variable,
+    so the spans opened by concurrent tasks get the right parent
+    """
+
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: list[Span] = []
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        parent = _current_span.get()
+        if parent is not None and parent.tracer is self:
+            for attribute in INHERITED_ATTRIBUTES:
+                if attribute in parent.attributes:
+                    attributes.setdefault(attribute, parent.attributes[attribute])
+        else:
+            parent = None
+        span = Span(name, self.trace_id, secrets.token_hex(8), parent.span_id if parent else None, time.time(),
+                    attributes, tracer=self)
+        started_at = time.perf_counter()
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = str(e) or type(e).__name__
+            raise e
+        finally:
+            _current_span.reset(token)
+            span.duration = time.perf_counter() - started_at
+            span.end_time = span.start_time + span.duration
+            self.spans.append(span)
+
+    def summary(self) -> list[dict]:
+        """
+        the spans grouped by phase and provider: count, errors, latency percentiles and the sum of the counters
+        """
+        groups: dict[tuple[str, str], list[Span]] = {}
+        for span in self.spans:
+            groups.setdefault((span.name, span.attributes.get("provider", "")), []).append(span)
+
+        summary = []
+        for (name, provider), spans in groups.items():
+            durations = [span.duration for span in spans]
+            counters = {}
+            for span in spans:
+                for counter, value in span.counters.items():
+                    counters[counter] = counters.get(counter, 0) + value
+            summary.append({"phase": name, "provider": provider, "count": len(spans),
+                            "errors": sum(1 for span in spans if span.error), "total": sum(durations),
+                            "p50": percentile(durations, 50), "p95": percentile(durations, 95),
+                            "p99": percentile(durations, 99), "max": max(durations), "counters": counters})
+        return summary
+
+    def write_report(self, path: str, run_id: str):
+        """
+        write the json report of the run: the summary of the phases and every span
+        """
+        report = {"run_id": run_id, "trace_id": self.trace_id, "phases": self.summary(),
+                  "spans": [span.to_dict() for span in self.spans]}
+        _write_atomic(path, json.dumps(report, indent=2))
+
+    def write_prometheus(self, path: str, provider: str, success: bool):
+        """
+        write the metrics of the last run of the provider in the text format of the prometheus node exporter
+        textfile collector
+        """
+        lines = [
+            "# HELP bolletta_sync_phase_duration_seconds Duration of the sync phases of the last run.",
+            "# TYPE bolletta_sync_phase_duration_seconds summary",
+        ]
+        error_lines = []
+        counter_lines = []
+        for phase in self.summary():
+            if phase["provider"] != provider:
+                continue
+            labels = f'provider="{provider}",phase="{phase["phase"]}"'
+            for quantile in ("p50", "p95", "p99"):
+                lines.append(f'bolletta_sync_phase_duration_seconds{{{labels},quantile="0.{quantile[1:]}"}} '
+                             f'{phase[quantile]:.6f}')
+            lines.append(f"bolletta_sync_phase_duration_seconds_sum{{{labels}}} {phase['total']:.6f}")
+            lines.append(f"bolletta_sync_phase_duration_seconds_count{{{labels}}} {phase['count']}")
+            error_lines.append(f"bolletta_sync_phase_errors{{{labels}}} {phase['errors']}")
+            for counter, value in phase["counters"].items():
+                counter_lines.append(f'bolletta_sync_phase_counter{{{labels},counter="{counter}"}} {value}')
+
+        lines += [
+            "# HELP bolletta_sync_phase_errors Failed spans of the sync phases of the last run.",
+            "# TYPE bolletta_sync_phase_errors gauge",
+            *error_lines,
+            "# HELP bolletta_sync_phase_counter Bytes and api calls of the sync phases of the last run.",
+            "# TYPE bolletta_sync_phase_counter gauge",
+            *counter_lines,
+            "# HELP bolletta_sync_last_run_timestamp_seconds End time of the last run.",
+            "# TYPE bolletta_sync_last_run_timestamp_seconds gauge",
+            f'bolletta_sync_last_run_timestamp_seconds{{provider="{provider}"}} {time.time():.3f}',
+            "# HELP bolletta_sync_last_run_success Whether the last run completed.",
+            "# TYPE bolletta_sync_last_run_success gauge",
+            f'bolletta_sync_last_run_success{{provider="{provider}"}} {int(success)}',
+        ]
+        _write_atomic(path, "\n".join(lines) + "\n")
+
+    def to_otlp(self) -> dict:
+        """
+        the spans in the opentelemetry otlp/json format
+        """
+        def value(item) -> dict:
+            if isinstance(item, bool):
+                return {"boolValue": item}
+            if isinstance(item, int):
+                return {"intValue": str(item)}
+            if isinstance(item, float):
+                return {"doubleValue": item}
+            return {"stringValue": str(item)}
+
+        spans = []
+        for span in self.spans:
+            attributes = {**span.attributes, **span.counters}
+            otlp_span = {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(int(span.start_time * 1e9)),
+                "endTimeUnixNano": str(int(span.end_time * 1e9)),
+                "attributes": [{"key": key, "value": value(item)} for key, item in attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+            }
+            if span.parent_id:
+                otlp_span["parentSpanId"] = span.parent_id
+            spans.append(otlp_span)
+
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "bolletta_sync"}}]},
+            "scopeSpans": [{"scope": {"name": "bolletta_sync"}, "spans": spans}],
+        }]}
+
+
+def _write_atomic(path: str, content: str):
+    with open(path + ".tmp", "w") as f:
+        f.write(content)
+    os.replace(path + ".tmp", path)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """
+    open a child span of the current span, nothing is recorded outside a traced run
+    """
+    current = _current_span.get()
+    if current is None or current.tracer is None:
+        yield Span(name, "", "", None, time.time(), attributes)
+        return
+    with current.tracer.span(name, **attributes) as child:
+        yield child
+
+
+def count(counter: str, value: int = 1):
+    """
+    add to a counter of the current span
+    """
+    current = _current_span.get()
+    if current is not None:
+        current.count(counter, value)